@@ -0,0 +1,100 @@
+# Microbenchmark: legacy frame decode (full decode, resize, colour conversion) vs FrameDecoder
+# (reduced-scale JPEG decode, resize skipping, reused buffers), time and allocations per frame.
+# Run from server/: python -m benchmarks.bench_decode
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from frame_handler import FRAME_HEADER, FrameDecoder, decode_frame_bytes
+from quality_controller import QUALITY_TIERS
+
+SOURCE_SIZES = ((320, 240), (640, 480), (1280, 720), (1920, 1080))
+
+def decode_legacy(message, size):
+    """The decode path before FrameDecoder: full-size decode, resize to size, new RGB copy."""
+    np_arr = np.frombuffer(message, np.uint8, offset=FRAME_HEADER.size)
+    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+    frame = cv2.resize(frame, size)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+def make_message(size, quality, seed=0):
+    """Binary websocket frame message with a smooth, camera-like JPEG of the given size."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+
+    small = rng.integers(0, 256, (height // 16 + 1, width // 16 + 1, 3), dtype=np.uint8)
+    image = cv2.GaussianBlur(cv2.resize(small, size, interpolation=cv2.INTER_CUBIC), (5, 5), 0)
+
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return FRAME_HEADER.pack(0, 0, width, height) + encoded.tobytes()
+
+def time_per_frame(fn, frames, repeat):
+    fn()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(frames):
+            fn()
+        best = min(best, (time.perf_counter() - start) / frames)
+    return best
+
+def allocated_per_frame(fn, frames):
+    """Mean bytes allocated per call (peak above the baseline, summed over calls)."""
+    fn()
+    total = 0
+
+    tracemalloc.start()
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        fn()
+        total += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return total / frames
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quality', type=int, default=80, help="JPEG quality of the test frames")
+    args = parser.parse_args()
+
+    targets = sorted({size for _, size in QUALITY_TIERS}, reverse=True)
+
+    print(f"{'source':>10s} {'target':>9s} {'legacy ms':>10s} {'fast ms':>8s} {'speedup':>8s} "
+          f"{'legacy KB':>10s} {'fast KB':>8s} {'mean diff':>10s}")
+
+    for source in SOURCE_SIZES:
+        message = make_message(source, args.quality)
+
+        for target in targets:
+            decoder = FrameDecoder()
+
+            def legacy():
+                return decode_legacy(message, target)
+
+            def fast():
+                return decode_frame_bytes(message, target, decoder)
+
+            legacy_time = time_per_frame(legacy, args.frames, args.repeat)
+            fast_time = time_per_frame(fast, args.frames, args.repeat)
+            legacy_bytes = allocated_per_frame(legacy, args.frames)
+            fast_bytes = allocated_per_frame(fast, args.frames)
+
+            # The fast path doesn't upscale, compare at its output size
+            reference, result = legacy(), fast()
+            if reference.shape != result.shape:
+                reference = cv2.resize(reference, (result.shape[1], result.shape[0]), interpolation=cv2.INTER_AREA)
+            diff = np.abs(reference.astype(np.int16) - result.astype(np.int16)).mean()
+
+            print(f"{'%dx%d' % source:>10s} {'%dx%d' % target:>9s} {legacy_time * 1e3:10.2f} {fast_time * 1e3:8.2f} "
+                  f"{legacy_time / fast_time:7.1f}x {legacy_bytes / 1024:10.0f} {fast_bytes / 1024:8.0f} {diff:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
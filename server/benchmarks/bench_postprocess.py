@@ -0,0 +1,132 @@
+# Microbenchmark: scalar torch landmark post-processing vs landmark_postprocess.
+# Run from server/: python -m benchmarks.bench_postprocess
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+import torch
+
+from landmark_extracter import align_hand_landmarks, correct_landmarks, default_landmarks, normalize_landmarks
+from landmark_postprocess import PARTS, PART_SLICES, NUM_NODES, landmarks_to_array, correct_sequence, correct_sessions
+
+Landmark = namedtuple('Landmark', ['x', 'y', 'z'])
+LandmarkList = namedtuple('LandmarkList', ['landmark'])
+
+def make_stream(num_frames, miss_rate, seed=0):
+    """Random walk around the default landmarks with randomly missing parts."""
+    rng = np.random.default_rng(seed)
+    base = np.concatenate([default_landmarks[p].numpy() for p in PARTS]).astype(np.float32)
+
+    frames = base + np.cumsum(rng.normal(0, 0.005, (num_frames, NUM_NODES, 3)), axis=0).astype(np.float32)
+    presence = rng.random((num_frames, len(PARTS))) >= miss_rate
+    return frames, presence
+
+def frame_dict(frame, presence, dtype):
+    return {
+        part_type: torch.tensor(frame[PART_SLICES[part_type]], dtype=dtype)
+        for i, part_type in enumerate(PARTS) if presence[i]
+    }
+
+def time_it(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def correct_landmarks_legacy(extracted_landmarks, prev_landmarks):
+    """The scalar torch path landmark_postprocess replaced, kept as its reference."""
+    if 'pose' in extracted_landmarks:
+        pose_lm = extracted_landmarks['pose']
+    else:
+        pose_lm = prev_landmarks['pose']
+
+    original_landmarks = []
+    for part_type in PARTS:
+        if part_type in extracted_landmarks:
+            landmark_list = extracted_landmarks[part_type]
+        elif part_type == 'pose':
+            landmark_list = prev_landmarks[part_type]
+        else:
+            # Missing hands are aligned to the current pose
+            landmark_list = align_hand_landmarks(prev_landmarks[part_type], pose_lm, part_type)
+
+        original_landmarks.append(landmark_list)
+
+    original_landmarks = normalize_landmarks(original_landmarks)
+    return torch.concat(original_landmarks, dim=0).to(dtype=torch.float64)
+
+def run_legacy(frames, presence):
+    prev_lm = {k: v.to(dtype=torch.float64) for k, v in default_landmarks.items()}
+    out = []
+    for frame, present in zip(frames, presence):
+        curr_lm = frame_dict(frame, present, torch.float64)
+        out.append(correct_landmarks_legacy(curr_lm, prev_lm).to(dtype=torch.float32))
+        prev_lm.update(curr_lm)
+    return torch.stack(out).numpy()
+
+def run_per_frame(frames, presence):
+    prev_lm = dict(default_landmarks)
+    out = []
+    for frame, present in zip(frames, presence):
+        curr_lm = frame_dict(frame, present, torch.float32)
+        out.append(correct_landmarks(curr_lm, prev_lm))
+        prev_lm.update(curr_lm)
+    return torch.stack(out).numpy()
+
+def run_sequence(frames, presence, out):
+    prev = np.concatenate([default_landmarks[p].numpy() for p in PARTS])
+    return correct_sequence(frames, presence, prev, out)
+
+def run_sessions(frames, presence, out):
+    # Every frame treated as the next frame of a different session
+    prev = np.repeat(np.concatenate([default_landmarks[p].numpy() for p in PARTS])[None], len(frames), axis=0)
+    return correct_sessions(frames, presence, prev, out)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--miss-rate', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    frames, presence = make_stream(args.frames, args.miss_rate)
+    out = np.empty_like(frames)
+
+    legacy_time, reference = time_it(lambda: run_legacy(frames, presence), args.repeat)
+    frame_time, per_frame = time_it(lambda: run_per_frame(frames, presence), args.repeat)
+    sequence_time, sequence = time_it(lambda: run_sequence(frames, presence, out).copy(), args.repeat)
+    sessions_time, _ = time_it(lambda: run_sessions(frames, presence, out), args.repeat)
+
+    print(f"frames: {args.frames}, missing part rate: {args.miss_rate}")
+    for name, t in [('legacy correct_landmarks', legacy_time), ('correct_landmarks (vectorized)', frame_time),
+                    ('correct_sequence (T batch)', sequence_time), ('correct_sessions (S batch)', sessions_time)]:
+        print(f"{name:32s} {t / args.frames * 1e6:9.2f} us/frame  {legacy_time / t:6.1f}x")
+
+    print(f"max abs diff vs legacy: per-frame {np.abs(per_frame - reference).max():.2e}, "
+          f"sequence {np.abs(sequence - reference).max():.2e}")
+
+    # MediaPipe landmark list -> array conversion
+    hand = LandmarkList([Landmark(*p) for p in frames[0, :21].tolist()])
+    pose = LandmarkList([Landmark(*p) for p in np.tile(frames[0, 42:], (2, 1))[:33].tolist()])
+
+    def legacy_convert():
+        for landmarks, n in ((hand, 21), (hand, 21), (pose, 25)):
+            torch.tensor([(lm.x, lm.y, lm.z) for lm in landmarks.landmark], dtype=torch.float64)[:n]
+
+    def array_convert():
+        for landmarks, n in ((hand, 21), (hand, 21), (pose, 25)):
+            landmarks_to_array(landmarks, n)
+
+    n = 2000
+    legacy_convert_time, _ = time_it(lambda: [legacy_convert() for _ in range(n)], args.repeat)
+    array_convert_time, _ = time_it(lambda: [array_convert() for _ in range(n)], args.repeat)
+    print(f"{'legacy landmark conversion':32s} {legacy_convert_time / n * 1e6:9.2f} us/frame")
+    print(f"{'landmarks_to_array':32s} {array_convert_time / n * 1e6:9.2f} us/frame  "
+          f"{legacy_convert_time / array_convert_time:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
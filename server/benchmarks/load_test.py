@@ -0,0 +1,545 @@
+# Load and soak test of the /ws endpoint: N simulated clients replay frame or landmark streams
+# at a fixed fps, with a ramp-up, against the real FastAPI app. Reports per-frame latency
+# percentiles (from ?ack=1 acknowledgements), dropped and late frames, server event-loop lag,
+# CPU and memory per session over time, and flags memory growth over long runs.
+# By default the server runs in-process and fully offline (echo text backend, randomly
+# initialised word model seeded into a temporary model cache).
+# Run from server/:
+#   python -m benchmarks.load_test --clients 8 --fps 15 --duration 60 --protocol landmarks
+#   python -m benchmarks.load_test --clients 4 --duration 3600 --output soak.json      # soak
+#   python -m benchmarks.load_test --url ws://localhost:7860/ws --server-pid 1234      # running server
+import argparse
+import asyncio
+import bisect
+import contextlib
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, deque
+
+import cv2
+import numpy as np
+
+from frame_handler import FRAME_HEADER, encode_landmark_packet
+from metrics import read_smaps_rollup
+
+LAG_PROBE_INTERVAL = 0.05  # seconds
+LATENCY_BINS = [float(edge) for edge in np.geomspace(1e-4, 100, 601)]  # seconds, bins about 2.3% wide
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+# ----- Offline Server -----
+def prepare_offline_environment(cache_dir):
+    """
+    Local stand-ins for Gemini and the Hub. Must run before main, landmark_worker, model_store or
+    text_language_generator are imported. The landmark worker warm-up, which would download
+    MediaPipe models, is skipped; frame protocols load them on the first frame instead.
+    """
+    os.environ['TEXT_BACKEND'] = 'echo'
+    os.environ['MODEL_CACHE_DIR'] = cache_dir
+    os.environ['MODEL_OFFLINE'] = '1'
+    os.environ['LANDMARK_WARM_UP'] = '0'
+
+    import torch
+    from model_store import model_store
+    from word_level_model import WORD_MODEL_REPO, WORD_MODEL_FILE, build_word_model
+
+    path = os.path.join(cache_dir, 'random_word_model.pth')
+    torch.save(build_word_model().state_dict(), path)
+    model_store.add(WORD_MODEL_REPO, WORD_MODEL_FILE, path)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class InProcessServer:
+    """Serves main.app with uvicorn on a background thread with its own event loop."""
+    def __init__(self, port):
+        import uvicorn
+        from main import app
+
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.server.serve(),), daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+def wait_ready(base_url, timeout):
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + '/ready') as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            status = json.load(e)
+            if status['status'] == 'failed':
+                raise RuntimeError(f"server failed to start: {status['error']}")
+        except OSError:
+            pass  # not listening yet
+        time.sleep(0.2)
+
+    raise TimeoutError(f"server not ready after {timeout}s")
+
+def scrape_metrics(base_url):
+    """{'name{labels}': value} of the untyped/counter/gauge samples at /metrics, {} if unavailable."""
+    try:
+        with urllib.request.urlopen(base_url + '/metrics') as response:
+            text = response.read().decode()
+    except OSError:
+        return {}
+
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+
+    return samples
+
+
+# ----- Latency Histograms -----
+class LatencyHistogram:
+    """
+    Durations in fixed log-spaced bins, so a soak's memory stays flat however many frames it
+    sends. Percentiles are reported as the upper edge of their bin (about 2.3% resolution).
+    """
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BINS) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BINS, value)] += 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(LATENCY_BINS[i], self.max) if i < len(LATENCY_BINS) else self.max
+        return self.max
+
+    def summary_ms(self):
+        if self.count == 0:
+            return None
+
+        p50, p95, p99 = (self.percentile(q) * 1000 for q in (50, 95, 99))
+        return {'count': self.count, 'p50_ms': round(p50, 1), 'p95_ms': round(p95, 1),
+                'p99_ms': round(p99, 1), 'max_ms': round(self.max * 1000, 1)}
+
+
+# ----- Event Loop Lag -----
+class LoopLagProbe:
+    """Sleeps `interval` in a loop and records how late each wake-up is."""
+    def __init__(self, interval=LAG_PROBE_INTERVAL, recent=200):
+        self.interval = interval
+        self.lags = LatencyHistogram()
+        self.recent = deque(maxlen=recent)  # last wake-ups, for progress lines
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - start - self.interval
+            self.lags.add(lag)
+            self.recent.append(lag)
+
+
+# ----- Process Sampling -----
+def process_tree(pid):
+    """pid and all its descendants (the landmark worker processes)."""
+    pids = [pid]
+
+    for parent in pids:
+        try:
+            for tid in os.listdir(f'/proc/{parent}/task'):
+                with open(f'/proc/{parent}/task/{tid}/children') as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+
+    return pids
+
+def cpu_seconds(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return 0.0
+
+    # utime and stime, fields 14 and 15 of stat
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+class ResourceSampler:
+    """
+    CPU and memory of a server's process tree over time. In-process, the load generator's
+    own CPU (its thread) is subtracted so the numbers are the server's. Memory per session
+    is the growth over the idle server, split between the connected clients.
+    """
+    def __init__(self, pid, client_cpu=None):
+        self.pid = pid
+        self.client_cpu = client_cpu
+        self.samples = []
+        self.last = None
+        self.baseline_pss = None  # before any client connected
+
+    def sample(self, elapsed, clients):
+        pids = process_tree(self.pid)
+        cpu = sum(cpu_seconds(pid) for pid in pids)
+        if self.client_cpu is not None:
+            cpu -= self.client_cpu()
+
+        memory = Counter()
+        for pid in pids:
+            memory.update(read_smaps_rollup(pid))
+        main = read_smaps_rollup(self.pid)
+
+        cpu_percent = None
+        if self.last is not None:
+            cpu_percent = 100 * (cpu - self.last[1]) / max(elapsed - self.last[0], 1e-9)
+        self.last = (elapsed, cpu)
+
+        sample = {
+            't': round(elapsed, 1),
+            'clients': clients,
+            'processes': len(pids),
+            'cpu_percent': None if cpu_percent is None else round(cpu_percent, 1),
+            'rss_mb': round(memory['rss'] / 2**20, 1),
+            'pss_mb': round(memory['pss'] / 2**20, 1),
+            'main_rss_mb': round(main.get('rss', 0) / 2**20, 1),
+        }
+        if clients == 0 and self.baseline_pss is None:
+            self.baseline_pss = sample['pss_mb']
+
+        if clients:
+            sample['cpu_percent_per_session'] = None if cpu_percent is None else round(cpu_percent / clients, 1)
+            if self.baseline_pss is not None:
+                sample['pss_mb_per_session'] = round((sample['pss_mb'] - self.baseline_pss) / clients, 2)
+
+        self.samples.append(sample)
+        return sample
+
+def memory_growth(samples, start, threshold):
+    """
+    Linear trend of the server process tree's PSS (landmark workers included) after start
+    seconds, in MB per hour. In-process, the load generator only keeps fixed-size state
+    (histograms, unacked frames), so it adds a constant, not a trend.
+    """
+    steady = [s for s in samples if s['t'] >= start]
+    if len(steady) < 3 or steady[-1]['t'] - steady[0]['t'] < 60:
+        return {'status': 'insufficient_data', 'samples': len(steady)}
+
+    t = np.array([s['t'] for s in steady]) / 3600
+    pss = np.array([s['pss_mb'] for s in steady])
+    slope = float(np.polyfit(t, pss, 1)[0])
+
+    return {
+        'status': 'growing' if slope > threshold else 'stable',
+        'mb_per_hour': round(slope, 1),
+        'threshold_mb_per_hour': threshold,
+        'start_mb': float(pss[0]),
+        'end_mb': float(pss[-1]),
+    }
+
+
+# ----- Client Streams -----
+def frame_messages(protocol, video, num_frames):
+    """Encoded frame payloads (without header) to replay: a recorded video or synthetic frames."""
+    if video is None:
+        from benchmarks.run_benchmarks import synthetic_jpeg
+        return [synthetic_jpeg(seed=i) for i in range(num_frames)]
+
+    capture = cv2.VideoCapture(video)
+    payloads = []
+
+    while len(payloads) < num_frames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        payloads.append(cv2.imencode('.jpg', cv2.resize(frame, (640, 480)), [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes())
+
+    capture.release()
+
+    if len(payloads) == 0:
+        raise ValueError(f"no frames could be read from {video}")
+
+    return payloads
+
+class StreamClient:
+    """
+    One simulated signer: sends a frame every 1/fps seconds (following the server's rate hints
+    unless told not to) and matches ?ack=1 acknowledgements to send times by sequence number.
+    The server processes a session's frames in order, so frames sent before an acked one
+    and never acked were dropped and are forgotten.
+    """
+    def __init__(self, url, protocol, payloads, fps, late_threshold, follow_rate_hints=True):
+        self.url = url
+        self.protocol = protocol
+        self.payloads = payloads
+        self.fps = fps
+        self.late_threshold = late_threshold
+        self.follow_rate_hints = follow_rate_hints
+
+        self.pending = deque()  # (seq, send time) of frames not acked yet
+        self.latencies = LatencyHistogram()
+        self.dropped_frames = 0
+        self.statuses = Counter()
+        self.stats = {'sent': 0, 'acked': 0, 'late': 0, 'behind_schedule': 0}
+        self.error = None
+        self.close_code = None
+
+    def message(self, seq):
+        payload = self.payloads[seq % len(self.payloads)]
+
+        if self.protocol == 'landmarks':
+            frame, presence = payload
+            return encode_landmark_packet(seq, time.time(), frame, presence)
+        return FRAME_HEADER.pack(seq, time.time(), 640, 480) + payload
+
+    async def run(self, stop_time, drain):
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            async with connect(f'{self.url}?protocol={self.protocol}&ack=1', max_size=None) as websocket:
+                receiver = asyncio.create_task(self.receive(websocket))
+
+                try:
+                    await self.send(websocket, stop_time)
+                    # Acks of the last frames are still on their way
+                    await asyncio.sleep(drain)
+                finally:
+                    receiver.cancel()
+        except ConnectionClosed as e:
+            # e.g. 1013 when the server is at capacity, 1001 when it evicted the session
+            self.close_code = e.rcvd.code if e.rcvd is not None else None
+            self.error = f"{type(e).__name__}: {e}"
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+
+    async def send(self, websocket, stop_time):
+        loop = asyncio.get_running_loop()
+        next_send = loop.time()
+        seq = 0
+
+        while next_send < stop_time:
+            delay = next_send - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif -delay > 1 / self.fps:
+                # The load generator itself can't keep up, the numbers understate the load
+                self.stats['behind_schedule'] += 1
+                next_send = loop.time()
+
+            # Only frames that left the client can be acked or dropped by the server
+            send_time = time.perf_counter()
+            await websocket.send(self.message(seq))
+            self.pending.append((seq, send_time))
+            self.stats['sent'] += 1
+
+            seq += 1
+            next_send += 1 / self.fps
+
+    async def receive(self, websocket):
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            async for message in websocket:
+                data = json.loads(message)
+                status = data.get('status')
+                self.statuses[status] += 1
+
+                if status == 'ack':
+                    frame_id = data['result']['frame_id']
+                    while self.pending and self.pending[0][0] < frame_id:
+                        self.pending.popleft()
+                        self.dropped_frames += 1
+
+                    if self.pending and self.pending[0][0] == frame_id:
+                        _, send_time = self.pending.popleft()
+                        latency = time.perf_counter() - send_time
+                        self.latencies.add(latency)
+                        self.stats['acked'] += 1
+                        self.stats['late'] += latency > self.late_threshold
+
+                elif status == 'rate' and self.follow_rate_hints:
+                    self.fps = data['result']['max_fps']
+        except ConnectionClosed:
+            # The sender sees the close too and records it
+            pass
+
+    def admitted(self):
+        """False if the server turned the session away (1013: at capacity or still starting)."""
+        return self.close_code != 1013
+
+    def dropped(self):
+        """Frames the server never processed (replaced in its intake by newer ones)."""
+        return self.dropped_frames + len(self.pending) if self.admitted() else 0
+
+
+async def run_load(args, url, payloads, sampler, lag_probe):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    stop_time = start + args.duration
+
+    clients = [StreamClient(url, args.protocol, payloads, args.fps, args.late_ms / 1000, not args.ignore_rate_hints)
+               for _ in range(args.clients)]
+    active = set()
+
+    async def run_client(i, client):
+        # Clients join evenly over the ramp-up
+        await asyncio.sleep(args.ramp_up * i / max(args.clients, 1))
+        active.add(i)
+        try:
+            await client.run(stop_time, args.drain)
+        finally:
+            active.discard(i)
+
+    tasks = [asyncio.create_task(run_client(i, client)) for i, client in enumerate(clients)]
+
+    while not all(task.done() for task in tasks):
+        elapsed = loop.time() - start
+        if sampler is not None:
+            sample = sampler.sample(elapsed, len(active))
+            lags = list(lag_probe.recent)[-int(args.sample_interval / LAG_PROBE_INTERVAL):] if lag_probe else []
+            lag = f", loop lag max {max(lags) * 1000:.1f} ms" if lags else ""
+            print(f"[{sample['t']:7.1f}s] clients {sample['clients']:3d}, cpu {sample['cpu_percent']}%, "
+                  f"pss {sample['pss_mb']} MB{lag}", file=sys.stderr)
+
+        await asyncio.wait(tasks, timeout=args.sample_interval)
+
+    return clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent websocket load and soak test.")
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--fps', type=float, default=15, help="frames per second each client sends")
+    parser.add_argument('--duration', type=float, default=60, help="seconds from the first client connecting to all stopping")
+    parser.add_argument('--ramp-up', type=float, default=10, help="seconds over which clients join")
+    # Text (data-URL) frames carry no sequence number, so their acks can't be matched
+    parser.add_argument('--protocol', choices=('binary', 'landmarks'), default='binary')
+    parser.add_argument('--video', help="recorded video to replay (binary), default synthetic frames")
+    parser.add_argument('--landmarks', help="session recording (.slr) or torch.save'd list of landmark dicts to replay (landmarks), default synthetic")
+    parser.add_argument('--frames', type=int, default=300, help="frames per replayed stream, looped")
+    parser.add_argument('--late-ms', type=float, default=250, help="ack latency above which a frame counts as late")
+    parser.add_argument('--ignore-rate-hints', action='store_true', help="keep sending at --fps when the server asks for less")
+    parser.add_argument('--drain', type=float, default=1.0, help="seconds to wait for the last acks")
+    parser.add_argument('--sample-interval', type=float, default=5.0)
+    parser.add_argument('--growth-start', type=float, default=None, help="seconds after which memory should be flat (default: ramp-up + 30)")
+    parser.add_argument('--max-growth-mb-per-hour', type=float, default=50)
+    parser.add_argument('--url', help="ws:// URL of a running server's /ws instead of the in-process one")
+    parser.add_argument('--server-pid', type=int, help="with --url, sample this process tree's CPU and memory")
+    parser.add_argument('--output', help="also write the JSON report here")
+    args = parser.parse_args()
+
+    server = None
+    lag_probe = None
+    sampler = None
+
+    # Keep stdout for the JSON report, the in-process server prints its own logs
+    with tempfile.TemporaryDirectory() as cache_dir, contextlib.redirect_stdout(sys.stderr):
+        if args.url is None:
+            prepare_offline_environment(cache_dir)
+
+        if args.protocol == 'landmarks':
+            from benchmarks.run_benchmarks import load_landmark_stream
+            frames, presence = load_landmark_stream(args.landmarks, args.frames)
+            payloads = list(zip(frames, presence))
+        else:
+            payloads = frame_messages(args.protocol, args.video, args.frames)
+
+        if args.url is None:
+            server = InProcessServer(free_port())
+            server.start()
+            base_url = f'http://127.0.0.1:{server.port}'
+            url = f'ws://127.0.0.1:{server.port}/ws'
+        else:
+            url = args.url
+            base_url = 'http' + url[len('ws'):].rsplit('/ws', 1)[0]
+
+        try:
+            startup = wait_ready(base_url, timeout=600)
+            print(f"Server ready: {json.dumps(startup['timings'])}", file=sys.stderr)
+
+            if server is not None:
+                lag_probe = LoopLagProbe()
+                probe = asyncio.run_coroutine_threadsafe(lag_probe.run(), server.loop)
+
+                # The load generator runs on this thread, its CPU isn't the server's
+                sampler = ResourceSampler(os.getpid(), client_cpu=time.thread_time)
+            elif args.server_pid is not None:
+                sampler = ResourceSampler(args.server_pid)
+
+            metrics_before = scrape_metrics(base_url)
+            clients = asyncio.run(run_load(args, url, payloads, sampler, lag_probe))
+            metrics_after = scrape_metrics(base_url)
+        finally:
+            if server is not None:
+                if lag_probe is not None:
+                    probe.cancel()
+                server.stop()
+
+    latencies = LatencyHistogram()
+    totals = Counter()
+    statuses = Counter()
+    for client in clients:
+        if not client.admitted():
+            continue
+        latencies.merge(client.latencies)
+        totals.update(client.stats)
+        totals['dropped'] += client.dropped()
+        statuses.update(client.statuses)
+
+    intake = {key.split('"')[1]: metrics_after[key] - metrics_before.get(key, 0)
+              for key in metrics_after if key.startswith('slt_frame_intake{') and key.split('"')[1] in ('received', 'processed', 'dropped')}
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'frames': dict(totals),
+        'ack_latency': latencies.summary_ms(),
+        'messages': dict(statuses),
+        'server_intake': intake,
+        'event_loop_lag': lag_probe.lags.summary_ms() if lag_probe else None,
+        'rejected_clients': sum(not client.admitted() for client in clients),
+        'client_errors': [client.error for client in clients if client.error],
+    }
+
+    if sampler is not None:
+        growth_start = args.growth_start if args.growth_start is not None else args.ramp_up + 30
+        report['resources'] = sampler.samples
+        report['memory_growth'] = memory_growth(sampler.samples, growth_start, args.max_growth_mb_per_hour)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if report.get('memory_growth', {}).get('status') == 'growing':
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Per-process memory of N server-like processes holding the word model, with and without
+# memory-mapped weights (WORD_MODEL_MMAP). Resolves the weights through the model cache.
+# Run from server/:
+#   python -m benchmarks.memory_usage --processes 4
+import argparse
+import gc
+import json
+import multiprocessing
+import sys
+
+import torch
+
+from metrics import read_smaps_rollup
+from word_level_model import WORD_MODEL_FILE, load_word_model, predict_word_gloss_batch, num_nodes, in_channels
+
+
+def hold_model(mmap, loaded, done, results):
+    before = read_smaps_rollup()
+
+    model = load_word_model(WORD_MODEL_FILE, mmap=mmap)
+    predict_word_gloss_batch(model, [torch.zeros((25, num_nodes, in_channels))])
+    gc.collect()
+
+    # Measure while every process holds its model, so shared pages are split between them
+    loaded.wait()
+    after = read_smaps_rollup()
+    results.put({kind: after[kind] - before.get(kind, 0) for kind in after})
+    done.wait()
+
+def measure(mmap, processes):
+    context = multiprocessing.get_context('spawn')
+    loaded, done = context.Barrier(processes), context.Barrier(processes)
+    results = context.Queue()
+
+    workers = [context.Process(target=hold_model, args=(mmap, loaded, done, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+
+    per_process = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    mean = {kind: sum(p[kind] for p in per_process) / processes / 2**20 for kind in per_process[0]}
+    return {f'{kind}_mb': round(value, 1) for kind, value in mean.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-process word model memory, copied vs memory-mapped weights.")
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    if not read_smaps_rollup():
+        sys.exit("/proc/self/smaps_rollup is not available on this platform")
+
+    report = {
+        'processes': args.processes,
+        'copy': measure(False, args.processes),
+        'mmap': measure(True, args.processes),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# Per-stage benchmark suite for the server pipeline. Runs offline: synthetic JPEG frames,
+# synthetic or recorded landmarks, randomly initialised MyModel, echo text backend.
+# Run from server/:
+#   python -m benchmarks.run_benchmarks --output results.json [--baseline baseline.json]
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from frame_handler import FrameBuffer, RingFrameBuffer, FRAME_HEADER, decode_frame, decode_frame_bytes
+from landmark_extracter import correct_landmarks, default_landmarks
+from landmark_postprocess import PARTS, PART_SLICES
+from session_recorder import RECORDING_SUFFIX, recording_stream
+from text_backends import EchoBackend
+from text_language_generator import GlossBuffer, create_text_buffer, generate_continue_text, text_cache
+from word_level_model import build_word_model, predict_word_gloss_batch, EmbeddingFrameBuffer
+
+from benchmarks.bench_postprocess import make_stream
+
+WINDOW_LENGTHS = (5, 15, 25)
+BATCH_SIZES = (1, 4, 16, 32)
+
+
+# ----- Timing -----
+def measure(fn, iterations, warmup=3):
+    for _ in range(warmup):
+        fn()
+
+    durations = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations[i] = time.perf_counter() - start
+
+    return summarize(durations)
+
+def summarize(durations, items_per_call=1):
+    p50, p95, p99 = np.percentile(durations, [50, 95, 99]) * 1000
+    return {
+        'iterations': len(durations),
+        'mean_ms': float(durations.mean() * 1000),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'throughput_per_s': float(items_per_call * len(durations) / durations.sum()),
+    }
+
+
+# ----- Inputs -----
+def synthetic_jpeg(width=640, height=480, seed=0):
+    """Smooth noise with a few shapes, compresses like a camera frame rather than pure noise."""
+    rng = np.random.default_rng(seed)
+    image = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (21, 21), 0)
+    cv2.circle(image, (width // 2, height // 3), height // 8, (200, 170, 150), -1)
+    cv2.rectangle(image, (width // 3, height // 2), (2 * width // 3, height), (60, 60, 120), -1)
+    return cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+
+def load_landmark_stream(path, num_frames):
+    """(frames, presence) from a session recording, a torch.save'd list of landmark dicts, or synthetic."""
+    if path is None:
+        return make_stream(num_frames, miss_rate=0.3)
+
+    if path.endswith(RECORDING_SUFFIX):
+        return recording_stream(path)
+
+    recorded = torch.load(path)
+    frames = np.zeros((len(recorded), 67, 3), dtype=np.float32)
+    presence = np.zeros((len(recorded), len(PARTS)), dtype=bool)
+
+    for t, landmarks in enumerate(recorded):
+        for i, part_type in enumerate(PARTS):
+            if part_type in landmarks:
+                frames[t, PART_SLICES[part_type]] = np.asarray(landmarks[part_type], dtype=np.float32)
+                presence[t, i] = True
+
+    return frames, presence
+
+def landmark_dicts(frames, presence):
+    return [
+        {part_type: torch.from_numpy(frame[PART_SLICES[part_type]].copy())
+         for i, part_type in enumerate(PARTS) if present[i]}
+        for frame, present in zip(frames, presence)
+    ]
+
+
+# ----- Stages -----
+def bench_decode(results, iterations):
+    jpeg = synthetic_jpeg()
+    data_url = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()
+    binary = FRAME_HEADER.pack(0, time.time(), 640, 480) + jpeg
+
+    results['decode_frame'] = measure(lambda: decode_frame(data_url), iterations)
+    results['decode_frame_bytes'] = measure(lambda: decode_frame_bytes(binary), iterations)
+
+def bench_landmarks(results, iterations, model_complexity):
+    try:
+        from landmark_extracter import create_holistic, detect_landmarks, extract_landmarks
+        holistic = create_holistic(model_complexity)
+    except Exception as e:
+        print(f"Skipping landmark extraction: {e}", file=sys.stderr)
+        return
+
+    frame = decode_frame_bytes(FRAME_HEADER.pack(0, 0.0, 640, 480) + synthetic_jpeg())
+    results['detect_landmarks'] = measure(lambda: detect_landmarks(frame, holistic), iterations)
+    results['extract_landmarks'] = measure(lambda: extract_landmarks(frame, holistic), iterations)
+    holistic.close()
+
+def bench_correct(results, frames, presence):
+    inputs = landmark_dicts(frames, presence)
+    prev_lm = dict(default_landmarks)
+    durations = np.empty(len(inputs))
+
+    for i, curr_lm in enumerate(inputs):
+        start = time.perf_counter()
+        correct_landmarks(curr_lm, prev_lm)
+        durations[i] = time.perf_counter() - start
+        prev_lm.update(curr_lm)
+
+    results['correct_landmarks'] = summarize(durations)
+
+def bench_frame_buffers(results, model, iterations):
+    frames = [torch.randn(67, 3) for _ in range(25)]
+    buffers = {
+        'FrameBuffer': FrameBuffer(max_size=25),
+        'RingFrameBuffer': RingFrameBuffer(max_size=25),
+        'EmbeddingFrameBuffer': EmbeddingFrameBuffer(model, max_size=25),
+    }
+
+    for name, frame_buffer in buffers.items():
+        for frame in frames:
+            frame_buffer.add_frame(frame)
+
+        results[f'{name}.get_frames'] = measure(frame_buffer.get_frames, iterations)
+        results[f'{name}.add_frame'] = measure(lambda: frame_buffer.add_frame(frames[0]), iterations)
+
+def bench_inference(results, model, iterations):
+    for length in WINDOW_LENGTHS:
+        for batch_size in BATCH_SIZES:
+            windows = [torch.randn(length, 67, 3) for _ in range(batch_size)]
+            embedded = [torch.randn(length, 480) for _ in range(batch_size)]
+
+            stats = measure(lambda: predict_word_gloss_batch(model, windows), iterations)
+            stats['throughput_per_s'] *= batch_size  # windows per second
+            results[f'predict_word_gloss[T={length},B={batch_size}]'] = stats
+
+            stats = measure(lambda: predict_word_gloss_batch(model, embedded, embedded=True), iterations)
+            stats['throughput_per_s'] *= batch_size
+            results[f'predict_word_gloss_embedded[T={length},B={batch_size}]'] = stats
+
+def bench_text(results, iterations):
+    backend = EchoBackend()
+    glosses = ['HELLO', 'HOW', 'YOU', 'FEEL', 'TODAY']
+    loop = asyncio.new_event_loop()
+
+    def append_glosses():
+        gloss_buffer = GlossBuffer()
+        for gloss in glosses:
+            gloss_buffer.append_gloss(gloss)
+        return gloss_buffer
+
+    def generate(clear_cache):
+        if clear_cache:
+            text_cache.clear()
+        gloss_buffer = append_glosses()
+        counter = {'last_text_time': time.time()}
+        loop.run_until_complete(generate_continue_text(gloss_buffer, create_text_buffer(), counter, backend=backend))
+
+    results['GlossBuffer.append_gloss'] = measure(append_glosses, iterations)
+    results['generate_continue_text[miss]'] = measure(lambda: generate(True), iterations)
+    results['generate_continue_text[hit]'] = measure(lambda: generate(False), iterations)
+    loop.close()
+
+
+# ----- Baseline Comparison -----
+def compare(results, baseline, tolerance):
+    """Stages whose p50 got slower than baseline by more than the tolerance ratio."""
+    regressions = {}
+
+    for stage, stats in results['stages'].items():
+        if stage not in baseline['stages']:
+            continue
+
+        ratio = stats['p50_ms'] / max(baseline['stages'][stage]['p50_ms'], 1e-9)
+        stats['p50_vs_baseline'] = ratio
+
+        if ratio > tolerance:
+            regressions[stage] = ratio
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each server pipeline stage.")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--landmarks', help="session recording (.slr) or torch.save'd list of landmark dicts to replay through correct_landmarks")
+    parser.add_argument('--landmark-frames', type=int, default=1000, help="synthetic frames when --landmarks is not given")
+    parser.add_argument('--holistic-complexity', type=int, default=2)
+    parser.add_argument('--skip-holistic', action='store_true')
+    parser.add_argument('--output', help="write results JSON here (default: stdout)")
+    parser.add_argument('--baseline', help="results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.2, help="allowed p50 slowdown ratio vs baseline")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = build_word_model().eval()
+    stages = {}
+
+    # Keep stdout for the JSON results, the pipeline prints its own timing logs
+    with contextlib.redirect_stdout(sys.stderr):
+        bench_decode(stages, args.iterations)
+        if not args.skip_holistic:
+            bench_landmarks(stages, min(args.iterations, 50), args.holistic_complexity)
+        bench_correct(stages, *load_landmark_stream(args.landmarks, args.landmark_frames))
+        bench_frame_buffers(stages, model, args.iterations)
+        bench_inference(stages, model, max(args.iterations // 4, 10))
+        bench_text(stages, args.iterations)
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'threads': torch.get_num_threads(),
+            'machine': platform.machine(),
+            'timestamp': time.time(),
+        },
+        'stages': stages,
+    }
+
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results['regressions'] = regressions
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for stage, ratio in regressions.items():
+        print(f"REGRESSION {stage}: p50 {ratio:.2f}x baseline", file=sys.stderr)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
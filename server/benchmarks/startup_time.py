@@ -0,0 +1,81 @@
+# Cold-start breakdown: per-module import time of main.py (python -X importtime) and the
+# time until /ready, with the start-up stage timings the server reports.
+# Run from server/:
+#   MODEL_OFFLINE=1 python -m benchmarks.startup_time [--top 15]
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+SERVER_MODULES = (
+    'main', 'frame_handler', 'landmark_extracter', 'landmark_postprocess', 'landmark_worker',
+    'word_level_model', 'inference_backends', 'inference_scheduler', 'motion_gate', 'metrics',
+    'model_store', 'startup', 'text_backends', 'text_cache', 'text_language_generator', 'video_translator',
+)
+
+
+def import_times():
+    """{module: cumulative seconds} of `import main` in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        capture_output=True, text=True, check=True
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        module = name.strip()
+
+        # Top-level packages wherever they were first imported (torch shows up under
+        # landmark_extracter otherwise), and the server's own modules
+        if ('.' not in module and not module.startswith('_')) or module in SERVER_MODULES:
+            times[module] = int(cumulative) / 1e6
+
+    return times
+
+def time_to_ready(timeout):
+    from fastapi.testclient import TestClient
+
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter() - start
+
+    with TestClient(main.app) as client:
+        while True:
+            response = client.get('/ready')
+            status = response.json()
+
+            if status['status'] != 'starting' or time.perf_counter() - start > timeout:
+                break
+            time.sleep(0.05)
+
+    return {
+        'import_s': imported,
+        'ready_s': time.perf_counter() - start,
+        'status': status['status'],
+        'error': status['error'],
+        'stages': status['timings'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server import time and time to ready.")
+    parser.add_argument('--top', type=int, default=15, help="slowest top-level imports to show")
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    times = import_times()
+    print("Import time (cumulative):", file=sys.stderr)
+    for module, seconds in sorted(times.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds:8.3f}s  {module}", file=sys.stderr)
+
+    ready = time_to_ready(args.timeout)
+    print(json.dumps({'imports': times, 'startup': ready}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
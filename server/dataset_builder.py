@@ -0,0 +1,299 @@
+# Builds a training set of corrected landmark sequences from a directory of sign videos with the
+# server's own extraction (extract_landmarks + correct_sequence), so training and serving share it.
+# Run from server/:
+#   python dataset_builder.py build videos/ datasets/include --classes data/Include_class_names.json
+#   python dataset_builder.py info datasets/include
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from landmark_postprocess import NUM_NODES
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+
+FRAMES_FILE = 'frames.f32'  # float32 (total_frames, NUM_NODES, 3), videos back to back
+INDEX_FILE = 'index.jsonl'  # one line per finished video: path, label, offset, length
+META_FILE = 'dataset.json'  # classes and build settings, written before the first video
+
+FRAME_BYTES = NUM_NODES * 3 * 4
+
+# INCLUDE style class directories, e.g. "12. Hello"
+LABEL_PREFIX = re.compile(r'^\d+\.\s*')
+
+
+# ----- Worker Process Side -----
+def extract_video_landmarks(path, sample_fps):
+    """Corrected (T, NUM_NODES, 3) float32 landmarks of a whole video, sampled at sample_fps (0 = every frame)."""
+    from landmark_extracter import default_landmarks
+    from landmark_postprocess import correct_sequence, landmarks_dict_to_frame
+    from landmark_worker import extract_video_chunk
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"could not open {path}")
+
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+
+    if not fps or math.isnan(fps):
+        fps = 30.0
+    step = max(1, round(fps / sample_fps)) if sample_fps > 0 else 1
+
+    frames, presence, _ = extract_video_chunk(path, 0, None, step, 0)
+    if len(frames) == 0:
+        return frames
+
+    prev, _ = landmarks_dict_to_frame(default_landmarks, None)
+    return correct_sequence(frames, presence, prev)
+
+
+# ----- Sources -----
+def label_from_path(path):
+    """Class name of a video from its directory name, without a leading "N. " number."""
+    return LABEL_PREFIX.sub('', os.path.basename(os.path.dirname(path))).strip()
+
+def find_videos(root):
+    """(path relative to root, label) of every video below root, in a stable order."""
+    videos = []
+
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                path = os.path.relpath(os.path.join(directory, name), root)
+                videos.append((path, label_from_path(path)))
+
+    return sorted(videos)
+
+def read_manifest(path):
+    """(video path, label) pairs of a two-column CSV file, paths relative to the video root."""
+    videos = []
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                video, label = line.rsplit(',', 1)
+                videos.append((video.strip(), label.strip()))
+
+    return videos
+
+
+# ----- Output -----
+def read_index(output_dir):
+    """Entries of the finished videos. A partly written last line (interrupted build) is ignored."""
+    entries = []
+
+    try:
+        with open(os.path.join(output_dir, INDEX_FILE)) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    except FileNotFoundError:
+        pass
+
+    return entries
+
+class DatasetWriter:
+    """
+    Appends videos to the frames file and the index. A video's frames are flushed before its
+    index line, and the index is the source of truth: on resume, frames past the last indexed
+    video (an interrupted write) are cut off and indexed videos are skipped.
+    """
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.entries = read_index(output_dir)
+        self.done = {entry['path'] for entry in self.entries}
+        self.num_frames = sum(entry['length'] for entry in self.entries)
+
+        index_path = os.path.join(output_dir, INDEX_FILE)
+        frames_path = os.path.join(output_dir, FRAMES_FILE)
+
+        if os.path.exists(frames_path) and os.path.getsize(frames_path) < self.num_frames * FRAME_BYTES:
+            raise ValueError(f"{frames_path} is shorter than its index, the dataset is corrupt")
+
+        # Rewrite the index without a torn last line
+        with open(index_path + '.tmp', 'w') as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry) + '\n')
+        os.replace(index_path + '.tmp', index_path)
+
+        self.frames_file = open(frames_path, 'ab')
+        self.frames_file.truncate(self.num_frames * FRAME_BYTES)
+        self.index_file = open(index_path, 'a')
+
+    def append(self, path, label, frames):
+        self.frames_file.write(np.ascontiguousarray(frames, dtype=np.float32).tobytes())
+        self.frames_file.flush()
+        os.fsync(self.frames_file.fileno())
+
+        entry = {'path': path, 'label': label, 'offset': self.num_frames, 'length': len(frames)}
+        self.index_file.write(json.dumps(entry) + '\n')
+        self.index_file.flush()
+
+        self.entries.append(entry)
+        self.done.add(path)
+        self.num_frames += len(frames)
+
+    def close(self):
+        self.frames_file.close()
+        self.index_file.close()
+
+def build_dataset(video_root, output_dir, videos, classes, sample_fps=0, num_workers=None, min_frames=1):
+    """
+    Extracts every (path, label) video not yet in output_dir with a process pool, in any order.
+    Labels are stored as indices into classes, videos of other classes are skipped.
+    Returns counts of the added, skipped and failed videos.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    meta_path = os.path.join(output_dir, META_FILE)
+
+    meta = {'classes': classes, 'sample_fps': sample_fps, 'num_nodes': NUM_NODES}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            existing = json.load(f)
+
+        if existing != meta:
+            raise ValueError(f"{output_dir} was built with different classes or settings, use a new output directory")
+    else:
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+
+    class_index = {name.lower(): i for i, name in enumerate(classes)}
+    writer = DatasetWriter(output_dir)
+    counts = {'added': 0, 'resumed': len(writer.done), 'unknown_class': 0, 'too_short': 0, 'failed': 0}
+
+    pending = []
+    for path, label in videos:
+        if path in writer.done:
+            continue
+        if label.lower() not in class_index:
+            counts['unknown_class'] += 1
+            continue
+        pending.append((path, class_index[label.lower()]))
+
+    # spawn avoids forking mediapipe threads, as in the server's landmark workers
+    context = multiprocessing.get_context('spawn')
+
+    executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=context)
+
+    try:
+        futures = {
+            executor.submit(extract_video_landmarks, os.path.join(video_root, path), sample_fps): (path, label)
+            for path, label in pending
+        }
+
+        for i, future in enumerate(as_completed(futures), 1):
+            path, label = futures[future]
+
+            try:
+                frames = future.result()
+            except Exception as e:
+                print(f"Error extracting {path}: {e}")
+                counts['failed'] += 1
+                continue
+
+            if len(frames) < min_frames:
+                counts['too_short'] += 1
+                continue
+
+            writer.append(path, label, frames)
+            counts['added'] += 1
+            print(f"[{i}/{len(pending)}] {path}: {len(frames)} frames")
+    finally:
+        # On interruption, drop the queued videos instead of extracting them all first
+        executor.shutdown(cancel_futures=True)
+        writer.close()
+
+    return counts
+
+
+# ----- Reading -----
+class LandmarkDataset:
+    """
+    Read-only view of a built dataset. Sequences and windows are slices of one memory-mapped
+    array, so nothing is copied or loaded up front (wrap with torch.from_numpy for training).
+    """
+    def __init__(self, output_dir):
+        with open(os.path.join(output_dir, META_FILE)) as f:
+            self.classes = json.load(f)['classes']
+
+        entries = read_index(output_dir)
+        self.paths = [entry['path'] for entry in entries]
+        self.offsets = np.array([entry['offset'] for entry in entries], dtype=np.int64)
+        self.lengths = np.array([entry['length'] for entry in entries], dtype=np.int64)
+        self.labels = np.array([entry['label'] for entry in entries], dtype=np.int64)
+
+        num_frames = int(self.lengths.sum())
+        if num_frames:
+            self.frames = np.memmap(os.path.join(output_dir, FRAMES_FILE), dtype=np.float32, mode='r',
+                                    shape=(num_frames, NUM_NODES, 3))
+        else:
+            self.frames = np.empty((0, NUM_NODES, 3), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        """(frames (T, NUM_NODES, 3), label) of the i-th video."""
+        return self.frames[self.offsets[i]:self.offsets[i] + self.lengths[i]], self.labels[i]
+
+    def windows(self, window_size, stride):
+        """(video index, start frame) of every full window_size window, videos shorter than it give none."""
+        return [
+            (i, start)
+            for i, length in enumerate(self.lengths.tolist())
+            for start in range(0, length - window_size + 1, stride)
+        ]
+
+    def window(self, i, start, window_size):
+        offset = self.offsets[i] + start
+        return self.frames[offset:offset + window_size], self.labels[i]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or inspect a memory-mapped landmark dataset from sign videos.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="extract videos into a dataset, resuming an existing one")
+    build.add_argument("video_root", help="directory of videos, one sub-directory per class unless --manifest is given")
+    build.add_argument("output_dir")
+    build.add_argument("--manifest", help="CSV of video path (relative to video_root),label")
+    build.add_argument("--classes", help="JSON list of class names, by default the sorted labels found")
+    build.add_argument("--sample-fps", type=float, default=0, help="frames per second to keep, 0 keeps every frame")
+    build.add_argument("--workers", type=int, default=os.cpu_count())
+    build.add_argument("--min-frames", type=int, default=1, help="skip videos with fewer landmark frames")
+
+    info = subparsers.add_parser("info", help="summarise a built dataset")
+    info.add_argument("output_dir")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        videos = read_manifest(args.manifest) if args.manifest else find_videos(args.video_root)
+
+        if args.classes:
+            with open(args.classes) as f:
+                classes = json.load(f)
+        else:
+            classes = sorted({label for _, label in videos})
+
+        counts = build_dataset(args.video_root, args.output_dir, videos, classes,
+                               args.sample_fps, args.workers, args.min_frames)
+        print(json.dumps(counts))
+    else:
+        dataset = LandmarkDataset(args.output_dir)
+        print(json.dumps({
+            'videos': len(dataset),
+            'frames': int(dataset.lengths.sum()),
+            'classes': len(dataset.classes),
+            'classes_present': len(set(dataset.labels.tolist())),
+            'mean_length': float(dataset.lengths.mean()) if len(dataset) else 0.0,
+        }))
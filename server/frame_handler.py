@@ -1,10 +1,29 @@
 from collections import deque
+import asyncio
 import base64
+import os
+import struct
+import time
 import numpy as np
+import torch
 import cv2
 
 MIN_SEQUENCE_LENGTH = 3
 
+# Client send-rate hints under overload
+RATE_HINT_INTERVAL = float(os.getenv("RATE_HINT_INTERVAL", 2.0))  # seconds
+MIN_CLIENT_FPS = 2
+MAX_CLIENT_FPS = 30
+
+# Binary frame header: sequence number, client timestamp (seconds), width, height
+FRAME_HEADER = struct.Struct('<IdHH')
+
+# Landmark packet: sequence number, client timestamp (seconds), presence flags, padding,
+# followed by float32 (x, y, z) for every node in LANDMARK_PARTS order
+LANDMARK_HEADER = struct.Struct('<IdB3x')
+LANDMARK_PARTS = (('left_hand', 21), ('right_hand', 21), ('pose', 25))
+LANDMARK_PACKET_SIZE = LANDMARK_HEADER.size + sum(n for _, n in LANDMARK_PARTS) * 3 * 4
+
 class FrameBuffer:
     def __init__(self, max_size=25):
         self.buffer = deque(maxlen=max_size)
@@ -22,28 +41,285 @@ class FrameBuffer:
         self.buffer.clear()
 
 
-def decode_frame(frameData):
+class RingFrameBuffer:
+    """
+    FrameBuffer backed by one preallocated (2 * max_size, 67, 3) float32 tensor.
+    Every frame is written at its slot and again max_size further, so the latest
+    frames are always one contiguous, time-ordered view that the model reads directly.
+    """
+    def __init__(self, max_size=25, frame_shape=(67, 3)):
+        self.max_size = max_size
+        self.storage = torch.zeros((2 * max_size, *frame_shape), dtype=torch.float32)
+        self.write_index = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add_frame(self, frame):
+        self.storage[self.write_index] = frame
+        self.storage[self.write_index + self.max_size] = frame
+
+        self.write_index = (self.write_index + 1) % self.max_size
+        self.size = min(self.size + 1, self.max_size)
+
+    def window(self, storage):
+        # Latest self.size rows of a mirrored (2 * max_size, ...) storage, oldest first
+        end = self.write_index + self.max_size
+        return storage[end - self.size:end]
+
+    def get_frames(self):
+        """Zero-copy (T, 67, 3) view, only valid until the next add_frame."""
+        if self.size < MIN_SEQUENCE_LENGTH:
+            return []
+
+        return self.window(self.storage)
+
+    def clear(self):
+        self.write_index = 0
+        self.size = 0
+
+
+# ----- Fast Decode -----
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic), they carry the image size
+JPEG_SOF_MARKERS = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+
+# libjpeg decodes straight to 1/2, 1/4 or 1/8 scale for a fraction of the cost, largest first
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def jpeg_size(data, offset=0):
+    """(width, height) from the SOF segment of JPEG bytes, None if not a JPEG."""
+    if data[offset:offset + 2] != b'\xff\xd8':
+        return None
+
+    i = offset + 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a segment
+            i += 2
+            continue
+
+        if marker in JPEG_SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+
+    return None
+
+def reduced_decode_flag(image_size, size):
+    """Cheapest imdecode flag whose output still covers size in both dimensions."""
+    if image_size is not None:
+        width, height = image_size
+
+        for scale, flag in REDUCED_DECODE_FLAGS:
+            # libjpeg rounds reduced dimensions up
+            if -(-width // scale) >= size[0] and -(-height // scale) >= size[1]:
+                return flag
+
+    return cv2.IMREAD_COLOR
+
+class FrameDecoder:
+    """
+    Decodes encoded images to RGB at a target size with as little work as possible: reduced-scale
+    JPEG decode, no resize when the decoded size already matches, no upscaling of smaller frames,
+    resize output written to a reused buffer and colour conversion in place.
+    A returned frame is only valid until the next decode call.
+    """
+    def __init__(self):
+        self.buffer = None
+
+    def get_buffer(self, size):
+        width, height = size
+
+        if self.buffer is None or self.buffer.shape != (height, width, 3):
+            self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+
+        return self.buffer
+
+    def decode(self, data, size=(640, 480), offset=0):
+        """data: encoded image bytes starting at offset, size: (width, height)."""
+        # View into the received buffer, no copy
+        np_arr = np.frombuffer(data, np.uint8, offset=offset)
+        frame = cv2.imdecode(np_arr, reduced_decode_flag(jpeg_size(data, offset), size))
+
+        if frame is None:
+            raise ValueError("could not decode image")
+
+        height, width = frame.shape[:2]
+        if (width, height) != size and (width > size[0] or height > size[1]):
+            frame = cv2.resize(frame, size, dst=self.get_buffer(size))
+
+        # frame is either freshly decoded or our own buffer, so convert in place
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
+
+
+def decode_frame(frameData, size=(640, 480), decoder=None):
+    """Decodes a base64 data-URL frame, see FrameDecoder (pass one per stream to reuse its buffer)."""
     try:
         frameData = frameData.split(",")[1]
         frame_bytes = base64.b64decode(frameData)
-        np_arr = np.frombuffer(frame_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
 
-        frame = cv2.resize(frame, (640, 480))
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        # frame = cv2.flip(frame, 1)
+        return (decoder or FrameDecoder()).decode(frame_bytes, size)
+    except Exception as e:
+        print(f"Error decoding frame: {e}")
+        return None
+
+# Totals over all sessions
+intake_totals = {'received': 0, 'processed': 0, 'dropped': 0, 'age_sum': 0.0, 'age_max': 0.0}
+
+class FrameIntake:
+    """
+    Single-slot, latest-frame-wins stage between the socket reader and frame processing.
+    A frame that is still waiting when a newer one arrives is dropped, so processing
+    always works on the newest frame and latency stays bounded under overload.
+    """
+    def __init__(self):
+        self.latest = None
+        self.ready = asyncio.Event()
+        self.closed = False
+
+        self.fps_hint = None
+        self.window_start = time.perf_counter()
+        self.window_processed = 0
+        self.window_dropped = 0
+
+        self.stats = {'received': 0, 'processed': 0, 'dropped': 0, 'age_sum': 0.0, 'age_max': 0.0}
+
+    def count(self, key, value=1):
+        self.stats[key] += value
+        intake_totals[key] += value
+
+    def put(self, frame_data):
+        self.count('received')
+
+        if self.latest is not None:
+            self.count('dropped')
+            self.window_dropped += 1
+
+        self.latest = (frame_data, time.perf_counter())
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def get(self):
+        """Waits for the newest frame, returns (frame_data, age in seconds) or None once closed."""
+        await self.ready.wait()
+
+        if self.latest is None:
+            return None
+
+        frame_data, receive_time = self.latest
+        self.latest = None
+        if not self.closed:
+            self.ready.clear()
+
+        age = time.perf_counter() - receive_time
+        self.count('processed')
+        self.count('age_sum', age)
+        self.stats['age_max'] = max(self.stats['age_max'], age)
+        intake_totals['age_max'] = max(intake_totals['age_max'], age)
+        self.window_processed += 1
+
+        return frame_data, age
+
+    def rate_hint(self):
+        """
+        Every RATE_HINT_INTERVAL seconds, returns a new max fps for the client if it
+        changed: the rate frames were actually processed at while frames were being
+        dropped, or one step back up once nothing is dropped anymore.
+        """
+        now = time.perf_counter()
+        elapsed = now - self.window_start
+
+        if elapsed < RATE_HINT_INTERVAL:
+            return None
+
+        hint = self.fps_hint
+        if self.window_dropped > 0:
+            hint = max(MIN_CLIENT_FPS, int(self.window_processed / elapsed))
+        elif self.fps_hint is not None:
+            hint = min(MAX_CLIENT_FPS, self.fps_hint + 1)
 
-        return frame
+        self.window_start = now
+        self.window_processed = 0
+        self.window_dropped = 0
+
+        if hint == self.fps_hint:
+            return None
+
+        self.fps_hint = hint
+        return hint
+
+
+def frame_sequence(frameData):
+    """Sequence number of a binary frame or landmark message (both headers start with it), None for text."""
+    if isinstance(frameData, bytes) and len(frameData) >= 4:
+        return struct.unpack_from('<I', frameData)[0]
+
+    return None
+
+def decode_frame_bytes(frameBytes, size=(640, 480), decoder=None):
+    """Decodes a binary message: FRAME_HEADER followed by raw JPEG/WebP bytes, see FrameDecoder."""
+    try:
+        if len(frameBytes) <= FRAME_HEADER.size:
+            raise ValueError("message shorter than frame header")
+
+        return (decoder or FrameDecoder()).decode(frameBytes, size, offset=FRAME_HEADER.size)
     except Exception as e:
         print(f"Error decoding frame: {e}")
         return None
 
-def decode_image_file(image):
-    nparr = np.frombuffer(image, np.uint8)
-    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+def encode_landmark_packet(seq, timestamp, frame, presence):
+    """
+    Landmark packet as a client sends it, from a (67, 3) frame in LANDMARK_PARTS order and
+    per-part presence flags. Parts that aren't present are sent as zeros.
+    """
+    flags = sum(1 << i for i, present in enumerate(presence) if present)
+    values = np.ascontiguousarray(frame, dtype=np.float32).copy()
 
-    frame = cv2.resize(frame, (640, 480))
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    # frame = cv2.flip(frame, 1)
+    start = 0
+    for present, (_, num_nodes) in zip(presence, LANDMARK_PARTS):
+        if not present:
+            values[start:start + num_nodes] = 0
+        start += num_nodes
 
-    return frame
\ No newline at end of file
+    return LANDMARK_HEADER.pack(seq, timestamp, flags) + values.tobytes()
+
+def decode_landmark_packet(packetBytes):
+    """
+    Decodes a client-side landmark packet into the dict `extract_landmarks` returns.
+    Parts whose presence bit (1 << index in LANDMARK_PARTS) is unset are left out.
+    """
+    try:
+        if len(packetBytes) != LANDMARK_PACKET_SIZE:
+            raise ValueError(f"expected {LANDMARK_PACKET_SIZE} bytes, got {len(packetBytes)}")
+
+        _, _, presence = LANDMARK_HEADER.unpack_from(packetBytes)
+        values = np.frombuffer(packetBytes, np.float32, offset=LANDMARK_HEADER.size).reshape(-1, 3)
+
+        landmarks = {}
+        start = 0
+        for i, (part_type, num_nodes) in enumerate(LANDMARK_PARTS):
+            if presence & (1 << i):
+                landmarks[part_type] = torch.tensor(values[start:start + num_nodes])
+            start += num_nodes
+
+        return landmarks
+    except Exception as e:
+        print(f"Error decoding landmark packet: {e}")
+        return None
+
+def decode_image_file(image):
+    return FrameDecoder().decode(image, (640, 480))
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import time
+
+from inference_scheduler import MicroBatcher
+from metrics import text_batch_size
+
+TEXT_BATCHING = os.getenv("TEXT_BATCHING", "1") == "1"
+TEXT_MAX_BATCH_SIZE = int(os.getenv("TEXT_MAX_BATCH_SIZE", 8))
+TEXT_BATCH_WAIT = float(os.getenv("TEXT_BATCH_WAIT_MS", 50)) / 1000  # seconds
+
+BATCH_INSTRUCT = (
+    'You are a gloss-to-English converter. Convert every gloss line below into one sentence, '
+    'using only its gloss tokens. No need to complete it with additional words. No explanations. '
+    'Answer with only a JSON array of the sentences as strings, one per gloss line, in the same order.'
+)
+
+
+def build_batch_prompt(gloss_inputs):
+    gloss_lines = '\n'.join(f'Gloss: {gloss_input}' for gloss_input in gloss_inputs)
+    return f'{BATCH_INSTRUCT}\n{gloss_lines}\nSentences:'
+
+def parse_batch_output(output, count):
+    """The list of count sentences in a batched answer, None if it isn't one."""
+    output = output.strip()
+
+    # Models like to wrap JSON in a code fence
+    if output.startswith('```'):
+        output = output.strip('`').strip()
+        if output.startswith('json'):
+            output = output[len('json'):]
+
+    try:
+        sentences = json.loads(output)
+    except json.JSONDecodeError:
+        return None
+
+    if not isinstance(sentences, list) or len(sentences) != count or not all(isinstance(s, str) for s in sentences):
+        return None
+
+    return sentences
+
+
+class PendingGeneration:
+    __slots__ = ('gloss_input', 'enqueue_time', 'future')
+
+    def __init__(self, gloss_input, enqueue_time, future):
+        self.gloss_input = gloss_input
+        self.enqueue_time = enqueue_time
+        self.future = future
+
+
+# Shared Generation Dispatcher
+class GenerationDispatcher(MicroBatcher):
+    """
+    Gathers gloss-to-text requests from all sessions for up to `max_wait` seconds (or until
+    `max_batch_size` distinct ones are pending) and answers them with one multi-item backend
+    call. A request that ends up alone, or whose batch can't be parsed, gets None and makes
+    its usual single call, with its own timeout and cancellation. Only non-streaming
+    generation is batched, a streamed sentence would arrive with the whole batch.
+    """
+    def __init__(self, backend, max_batch_size=TEXT_MAX_BATCH_SIZE, max_wait=TEXT_BATCH_WAIT):
+        super().__init__(max_batch_size, max_wait)
+        self.backend = backend
+        self.batches = set()
+
+        self.stats = {
+            'requests': 0,
+            'single_calls': 0,
+            'batch_calls': 0,
+            'batched_requests': 0,
+            'deduplicated': 0,
+            'batch_failures': 0,
+            'queue_wait_sum': 0.0,
+        }
+
+    async def submit(self, gloss_input):
+        """The raw answer for gloss_input from a batched call, or None to generate it alone."""
+        future = asyncio.get_running_loop().create_future()
+        return await self.enqueue(PendingGeneration(gloss_input, time.perf_counter(), future))
+
+    def batch_ready(self):
+        # Duplicates share an answer, so only distinct gloss inputs fill a batch
+        return len({request.gloss_input for request in self.pending}) >= self.max_batch_size
+
+    def take_batch(self):
+        """Requests up to max_batch_size distinct gloss inputs, grouped by gloss input."""
+        groups = {}
+        taken = 0
+        for request in self.pending:
+            if request.gloss_input not in groups and len(groups) == self.max_batch_size:
+                break
+            groups.setdefault(request.gloss_input, []).append(request)
+            taken += 1
+
+        del self.pending[:taken]
+        return groups
+
+    async def dispatch(self, groups):
+        # Don't hold up the next batch while the backend answers this one
+        task = asyncio.create_task(self._run_batch(groups))
+        self.batches.add(task)
+        task.add_done_callback(self.batches.discard)
+
+    async def _run_batch(self, groups):
+        now = time.perf_counter()
+
+        for requests in groups.values():
+            for request in requests:
+                self.stats['requests'] += 1
+                self.stats['queue_wait_sum'] += now - request.enqueue_time
+
+        # Sessions that disconnected while waiting don't need an answer
+        groups = {gloss_input: requests for gloss_input, requests in groups.items()
+                  if any(not request.future.done() for request in requests)}
+
+        answers = None
+        if len(groups) > 1:
+            self.stats['batch_calls'] += 1
+            self.stats['batched_requests'] += len(groups)
+            text_batch_size.observe(len(groups))
+
+            gloss_inputs = list(groups)
+            prompt = build_batch_prompt(gloss_inputs)
+            max_tokens = sum(2 * len(gloss_input.split()) + 4 for gloss_input in gloss_inputs) + len(prompt.split())
+
+            try:
+                answers = parse_batch_output(await self.backend.generate(prompt, max_new_tokens=max_tokens), len(groups))
+            except asyncio.TimeoutError:
+                print("Error in batched text generation: timed out")
+            except Exception as e:
+                print(f"Error in batched text generation: {e}")
+
+            if answers is None:
+                # Fall back to one call per request
+                self.stats['batch_failures'] += 1
+            else:
+                answers = dict(zip(gloss_inputs, answers))
+
+        for gloss_input, requests in groups.items():
+            requests = [request for request in requests if not request.future.done()]
+            # An empty sentence in a batch is more likely a glitch than an answer
+            answer = (answers.get(gloss_input) or None) if answers is not None else None
+
+            if answer is None:
+                self.stats['single_calls'] += len(requests)
+            else:
+                self.stats['deduplicated'] += len(requests) - 1
+
+            for request in requests:
+                request.future.set_result(answer)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['avg_batch_size'] = stats['batched_requests'] / max(stats['batch_calls'], 1)
+        stats['avg_queue_wait'] = stats['queue_wait_sum'] / max(stats['requests'], 1)
+        stats['queued'] = len(self.pending)
+        return stats
@@ -0,0 +1,175 @@
+import argparse
+import os
+import threading
+import time
+import warnings
+
+import torch
+from torch import nn
+
+from word_level_model import build_word_model, load_word_model, predict_word_gloss_batch, num_nodes, in_channels, WORD_MODEL_FILE
+
+WORD_MODEL_BACKEND = os.getenv("WORD_MODEL_BACKEND", "eager")
+
+# ----- Traced Backend -----
+class TracedWordModel(nn.Module):
+    """
+    TorchScript version of MyModel. The frame encoder is traced once, the sequence
+    classifier is traced, frozen and optimized lazily per window length (fixed-length buckets).
+    """
+    def __init__(self, model, bucket_lengths=(25,)):
+        super().__init__()
+        self.model = model
+        self.frame_dim = model.frame_encoder.frame_fc[0].out_features
+        self.classifiers = {}
+
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter("ignore", torch.jit.TracerWarning)
+
+            example = torch.zeros((1, 1, num_nodes * in_channels))
+            self.frame_encoder = torch.jit.freeze(torch.jit.trace(model.frame_encoder.eval(), example))
+
+            for length in bucket_lengths:
+                self.get_classifier(length)
+
+    def get_classifier(self, length):
+        if length not in self.classifiers:
+            example = torch.zeros((1, length, self.frame_dim))
+
+            with torch.no_grad(), warnings.catch_warnings():
+                warnings.simplefilter("ignore", torch.jit.TracerWarning)
+                traced = torch.jit.trace(self.model.sequence_classifier.eval(), example)
+                self.classifiers[length] = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+        return self.classifiers[length]
+
+    def sequence_classifier(self, x):
+        return self.get_classifier(x.shape[1])(x)
+
+    def forward(self, x):
+        return self.sequence_classifier(self.frame_encoder(x))
+
+
+# ----- Int8 Backend -----
+class WithoutMHAFastpath(nn.Module):
+    """
+    Runs a module with the MultiheadAttention fast path off. The switch is process-wide and
+    inference runs on several threads, so calls are counted under a lock: the first one in
+    turns the fast path off and the last one out restores the previous setting.
+    """
+    lock = threading.Lock()
+    active_calls = 0
+    saved_enabled = True
+
+    def __init__(self, module):
+        super().__init__()
+        self.module = module
+
+    def forward(self, *args):
+        cls = WithoutMHAFastpath
+        with cls.lock:
+            if cls.active_calls == 0:
+                cls.saved_enabled = torch.backends.mha.get_fastpath_enabled()
+                torch.backends.mha.set_fastpath_enabled(False)
+            cls.active_calls += 1
+
+        try:
+            return self.module(*args)
+        finally:
+            with cls.lock:
+                cls.active_calls -= 1
+                if cls.active_calls == 0:
+                    torch.backends.mha.set_fastpath_enabled(cls.saved_enabled)
+
+
+# ----- Backend Factory -----
+def quantize_word_model(model):
+    """
+    Dynamically quantized int8 Linear layers (frame projection, transformer FFNs, classifier).
+    The MultiheadAttention fast path can't read packed int8 weights, so it is switched off
+    while a quantized sequence classifier runs (see WithoutMHAFastpath). Eager models keep
+    using it, except for calls that overlap an int8 one.
+    """
+    quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    quantized.sequence_classifier = WithoutMHAFastpath(quantized.sequence_classifier)
+    return quantized
+
+INFERENCE_BACKENDS = {
+    'eager': lambda model: model,
+    'int8': quantize_word_model,
+    'traced': TracedWordModel,
+}
+
+def create_inference_backend(model, name=WORD_MODEL_BACKEND):
+    """Wraps an eager MyModel; every backend supports model(x), .frame_encoder and .sequence_classifier."""
+    if name not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown word model backend '{name}', expected one of {list(INFERENCE_BACKENDS)}")
+
+    return INFERENCE_BACKENDS[name](model.eval())
+
+
+# ----- Parity Check -----
+def check_backend_parity(reference, candidate, windows, batch_size=16):
+    """
+    Replays landmark windows (list of (T, 67, 3) tensors) through both models and
+    reports top-1 agreement, confidence drift and per-window latency.
+    """
+    report = {'windows': len(windows), 'top1_agreement': 0.0,
+              'mean_conf_drift': 0.0, 'max_conf_drift': 0.0,
+              'reference_ms': 0.0, 'candidate_ms': 0.0}
+
+    if len(windows) == 0:
+        return report
+
+    matches = 0
+    drifts = []
+
+    for start in range(0, len(windows), batch_size):
+        batch = windows[start:start + batch_size]
+
+        t0 = time.perf_counter()
+        expected = predict_word_gloss_batch(reference, batch)
+        t1 = time.perf_counter()
+        actual = predict_word_gloss_batch(candidate, batch)
+        t2 = time.perf_counter()
+
+        report['reference_ms'] += (t1 - t0) * 1000
+        report['candidate_ms'] += (t2 - t1) * 1000
+
+        for (ref_gloss, ref_conf), (gloss, conf) in zip(expected, actual):
+            matches += ref_gloss == gloss
+            drifts.append(abs(ref_conf - conf))
+
+    report['top1_agreement'] = matches / len(windows)
+    report['mean_conf_drift'] = sum(drifts) / len(drifts)
+    report['max_conf_drift'] = max(drifts)
+    report['reference_ms'] /= len(windows)
+    report['candidate_ms'] /= len(windows)
+    return report
+
+def random_windows(count, length=25, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return [torch.randn((length, num_nodes, in_channels), generator=generator) for _ in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a word model backend against eager inference.")
+    parser.add_argument("--backend", default="int8", choices=list(INFERENCE_BACKENDS))
+    parser.add_argument("--windows", help="torch.save'd list of (T, 67, 3) landmark windows to replay")
+    parser.add_argument("--count", type=int, default=256, help="random windows when --windows is not given")
+    parser.add_argument("--random-weights", action="store_true", help="skip the Hub download (offline smoke test)")
+    args = parser.parse_args()
+
+    if args.random_weights:
+        model = build_word_model().eval()
+    else:
+        model = load_word_model(WORD_MODEL_FILE)
+
+    windows = torch.load(args.windows) if args.windows else random_windows(args.count)
+
+    # Backends don't modify the eager model (quantize_dynamic works on a copy)
+    candidate = create_inference_backend(model, args.backend)
+
+    report = check_backend_parity(model, candidate, windows)
+    for key, value in report.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+from metrics import inference_batch_size, inference_queue_wait_seconds, model_inference_seconds
+from word_level_model import predict_word_gloss_batch
+
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 32))
+MAX_WAIT = float(os.getenv("INFERENCE_MAX_WAIT_MS", 5)) / 1000  # seconds
+
+
+class PendingRequest:
+    __slots__ = ('frame_seq', 'embedded', 'enqueue_time', 'future')
+
+    def __init__(self, frame_seq, embedded, enqueue_time, future):
+        self.frame_seq = frame_seq
+        self.embedded = embedded
+        self.enqueue_time = enqueue_time
+        self.future = future
+
+
+# Micro-Batching
+class MicroBatcher:
+    """
+    Shared micro-batching machinery. Requests (with a `future`) from all sessions queue in
+    `pending`; a worker task takes a batch once one is full (`batch_ready`) or `max_wait`
+    seconds after the first request, and runs it. Subclasses choose which pending requests
+    make up a batch (`take_batch`), run it (`_run_batch`) and resolve the futures.
+    """
+    def __init__(self, max_batch_size, max_wait):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.pending = []
+        self.has_pending = None
+        self.batch_full = None
+        self.worker = None
+
+    def start(self):
+        # Worker is bound to the running event loop, so it is created on first use
+        if self.worker is None or self.worker.done():
+            self.has_pending = asyncio.Event()
+            self.batch_full = asyncio.Event()
+            self.worker = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    async def enqueue(self, request):
+        """Queues a request and waits for its future."""
+        self.start()
+        self.pending.append(request)
+
+        self.has_pending.set()
+        if self.batch_ready():
+            self.batch_full.set()
+
+        return await request.future
+
+    def batch_ready(self):
+        return len(self.pending) >= self.max_batch_size
+
+    def take_batch(self):
+        batch = self.pending[:self.max_batch_size]
+        del self.pending[:self.max_batch_size]
+        return batch
+
+    async def dispatch(self, batch):
+        await self._run_batch(batch)
+
+    async def _run(self):
+        while True:
+            await self.has_pending.wait()
+
+            if not self.batch_ready():
+                # Give other sessions a short deadline to join this batch
+                try:
+                    await asyncio.wait_for(self.batch_full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self.take_batch()
+
+            if len(self.pending) == 0:
+                self.has_pending.clear()
+            if not self.batch_ready():
+                self.batch_full.clear()
+
+            await self.dispatch(batch)
+
+    async def _run_batch(self, batch):
+        raise NotImplementedError
+
+
+# Shared Micro-Batching Scheduler
+class InferenceScheduler(MicroBatcher):
+    """
+    Gathers word-gloss requests from all websocket sessions for up to `max_wait` seconds
+    (or until `max_batch_size` are pending), buckets them by sequence length and runs
+    one batched forward pass per bucket. Each session awaits its own result.
+    """
+    def __init__(self, model, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT):
+        super().__init__(max_batch_size, max_wait)
+        self.model = model
+
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'batch_size_sum': 0,
+            'batch_size_max': 0,
+            'queue_wait_sum': 0.0,
+            'queue_wait_max': 0.0,
+        }
+
+    async def predict(self, frame_seq, embedded=False):
+        """
+        Queue one frame sequence (or cached frame embeddings with embedded=True)
+        and wait for its (word_gloss, confidence).
+        """
+        future = asyncio.get_running_loop().create_future()
+        return await self.enqueue(PendingRequest(frame_seq, embedded, time.perf_counter(), future))
+
+    async def _run_batch(self, batch):
+        # Bucket by input kind and sequence length, windows of different length can't share a pass
+        buckets = defaultdict(list)
+        now = time.perf_counter()
+
+        for request in batch:
+            if request.future.done():
+                # Session disconnected while waiting
+                continue
+
+            buckets[(request.embedded, len(request.frame_seq))].append(request)
+
+            wait = now - request.enqueue_time
+            self.stats['requests'] += 1
+            self.stats['queue_wait_sum'] += wait
+            self.stats['queue_wait_max'] = max(self.stats['queue_wait_max'], wait)
+            inference_queue_wait_seconds.observe(wait)
+
+        for (embedded, _), requests in buckets.items():
+            self.stats['batches'] += 1
+            self.stats['batch_size_sum'] += len(requests)
+            self.stats['batch_size_max'] = max(self.stats['batch_size_max'], len(requests))
+            inference_batch_size.observe(len(requests))
+
+            try:
+                with model_inference_seconds.time():
+                    results = await asyncio.to_thread(
+                        predict_word_gloss_batch, self.model, [r.frame_seq for r in requests], embedded
+                    )
+            except Exception as e:
+                print(f"Error in batched inference: {e}")
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            for request, result in zip(requests, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['avg_batch_size'] = stats['batch_size_sum'] / max(stats['batches'], 1)
+        stats['avg_queue_wait'] = stats['queue_wait_sum'] / max(stats['requests'], 1)
+        stats['queued'] = len(self.pending)
+        return stats
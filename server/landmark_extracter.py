@@ -1,19 +1,35 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import torch
 
-mp_holistic = mp.solutions.holistic
-mp_drawing = mp.solutions.drawing_utils
+from landmark_postprocess import landmarks_to_array, correct_frame
 
-holistic = mp_holistic.Holistic(
-    static_image_mode=False,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5,
-    model_complexity=2
-)
+def mediapipe_solutions():
+    # Only the landmark workers run MediaPipe, so the server process never pays its import
+    import mediapipe as mp
+    return mp.solutions
 
-def detect_landmarks(image):
+def create_holistic(model_complexity=2):
+    """
+    Holistic keeps temporal tracking state, so every stream needs its own instance.
+    """
+    return mediapipe_solutions().holistic.Holistic(
+        static_image_mode=False,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+        model_complexity=model_complexity
+    )
+
+# Default instance for single-stream use, created on first use
+holistic = None
+
+def get_holistic():
+    global holistic
+    if holistic is None:
+        holistic = create_holistic()
+    return holistic
+
+def detect_landmarks(image, holistic=None):
     landmarks = {
         'left_hand': None,
         'right_hand': None,
@@ -21,6 +37,9 @@ def detect_landmarks(image):
         # 'face': None
     }
 
+    if holistic is None:
+        holistic = get_holistic()
+
     results = holistic.process(image)
 
     if results.left_hand_landmarks:
@@ -39,6 +58,8 @@ def detect_landmarks(image):
 
 def process_frame(frame):
     result = detect_landmarks(frame)
+    mp_holistic = mediapipe_solutions().holistic
+    mp_drawing = mediapipe_solutions().drawing_utils
 
     if result['left_hand']:
       mp_drawing.draw_landmarks(frame, result['left_hand'], mp_holistic.HAND_CONNECTIONS)
@@ -55,7 +76,10 @@ def process_frame(frame):
     return frame
 
 
-default_landmarks = torch.load('data/default_landmarks.pth')
+default_landmarks = {
+    part_type: landmark_list.to(dtype=torch.float32)
+    for part_type, landmark_list in torch.load('data/default_landmarks.pth').items()
+}
 
 def normalize_vector(v):
     return v / (torch.norm(v) + 1e-8)
@@ -127,7 +151,7 @@ def normalize_landmarks(landmarks):
 
   return landmarks
 
-def extract_landmarks(image): 
+def extract_landmarks(image, holistic=None):
   if image.shape[0] == 3:
     image = image.permute(1, 2, 0)
 
@@ -141,44 +165,20 @@ def extract_landmarks(image):
       # 'face': 468
   }
 
-  result = detect_landmarks(image)
+  result = detect_landmarks(image, holistic)
 
   extracted_result = {}
 
   for part_type, landmarks in result.items():
     if landmarks:
-      landmark_list = torch.tensor([(lm.x,lm.y,lm.z) for lm in landmarks.landmark], dtype=torch.float64)
-      extracted_result[part_type] = landmark_list[:num_landmarks[part_type]]
+      landmark_list = landmarks_to_array(landmarks, num_landmarks[part_type])
+      extracted_result[part_type] = torch.from_numpy(landmark_list)
 
   return extracted_result
 
 def correct_landmarks(extracted_landmarks, prev_landmarks):
-  original_landmarks = []
-  parts = ['left_hand', 'right_hand', 'pose']
-
-  if 'pose' in extracted_landmarks:
-    pose_lm = extracted_landmarks['pose']
-  else:
-    pose_lm = prev_landmarks['pose']
-
-  for part_type in parts:
-    if part_type not in extracted_landmarks:
-      if part_type == 'left_hand' or part_type == 'right_hand':
-        # Missing Hand Landmarks
-        landmark_list = align_hand_landmarks(prev_landmarks[part_type], pose_lm, part_type)
-        # landmark_list = torch.tensor([(0,0,0)] * num_landmarks[part_type], dtype=torch.float64)
-
-      else:
-        # Missing Pose Landmarks
-        landmark_list = prev_landmarks[part_type]
-
-    else:
-        # Available landmarks
-        landmark_list = extracted_landmarks[part_type]
-
-    original_landmarks.append(landmark_list)
-
-  original_landmarks = normalize_landmarks(original_landmarks)
-
-  original_landmarks = torch.concat(original_landmarks, dim=0)
-  return original_landmarks.to(dtype=torch.float64)
\ No newline at end of file
+  """
+  Fills missing parts from prev_landmarks (missing hands are aligned to the current pose)
+  and normalizes. Returns a (67, 3) float32 tensor.
+  """
+  return correct_frame(extracted_landmarks, prev_landmarks)
@@ -0,0 +1,195 @@
+from itertools import chain, islice
+
+import numpy as np
+import torch
+
+# Vectorized float32 landmark post-processing on (B, 67, 3) arrays, where B is either
+# consecutive frames of one session or one frame of many sessions.
+# Matches the scalar torch path it replaced (`correct_landmarks_legacy` in
+# benchmarks/bench_postprocess.py) within float32 tolerance.
+
+PARTS = ('left_hand', 'right_hand', 'pose')
+PART_SLICES = {
+    'left_hand': slice(0, 21),
+    'right_hand': slice(21, 42),
+    'pose': slice(42, 67),
+}
+NUM_NODES = 67
+
+# Pose nodes (wrist, index, pinky) each hand is aligned to when missing
+HAND_POSE_NODES = {
+    'left_hand': (16, 20, 18),
+    'right_hand': (15, 19, 17),
+}
+# Pose node each hand's wrist is moved to after normalization
+HAND_ROOT_NODES = {
+    'left_hand': 15,
+    'right_hand': 16,
+}
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+
+
+# ----- Conversion -----
+def landmarks_to_array(landmarks, num_nodes, out=None):
+    """Copies the first num_nodes MediaPipe landmarks into a (num_nodes, 3) float32 array."""
+    values = np.fromiter(
+        chain.from_iterable((lm.x, lm.y, lm.z) for lm in islice(landmarks.landmark, num_nodes)),
+        dtype=np.float32, count=num_nodes * 3
+    )
+
+    if out is None:
+        return values.reshape(num_nodes, 3)
+
+    out[:] = values.reshape(num_nodes, 3)
+    return out
+
+def landmarks_dict_to_frame(landmarks, prev, out=None):
+    """
+    Fills a (67, 3) frame from a landmarks dict, taking missing parts from prev (dict or
+    (67, 3) array). Returns the frame and the (3,) presence mask.
+    """
+    if out is None:
+        out = np.empty((NUM_NODES, 3), dtype=np.float32)
+
+    presence = np.zeros(len(PARTS), dtype=bool)
+
+    for i, part_type in enumerate(PARTS):
+        part_slice = PART_SLICES[part_type]
+
+        if part_type in landmarks:
+            out[part_slice] = landmarks[part_type]
+            presence[i] = True
+        elif isinstance(prev, dict):
+            out[part_slice] = prev[part_type]
+        else:
+            out[part_slice] = prev[part_slice]
+
+    return out, presence
+
+
+# ----- Hand Alignment -----
+# np.cross/np.linalg.norm carry a lot of per-call overhead for (B, 3) inputs
+CROSS_A, CROSS_B = np.array([1, 2, 0]), np.array([2, 0, 1])
+
+def cross(a, b):
+    return a.take(CROSS_A, 1) * b.take(CROSS_B, 1) - a.take(CROSS_B, 1) * b.take(CROSS_A, 1)
+
+def normalize_vectors(v):
+    return v / (np.sqrt(np.einsum('ij,ij->i', v, v))[:, None] + 1e-8)
+
+def hand_rotation_matrices(wrist, index, pinky):
+    """(B, 3) wrist/index/pinky -> (B, 3, 3) rotations with the hand axes as columns."""
+    x_axis = normalize_vectors(index - wrist)
+    y_axis = normalize_vectors(pinky - wrist)
+    z_axis = normalize_vectors(cross(x_axis, y_axis))
+
+    # Re-orthogonalize
+    y_axis = normalize_vectors(cross(z_axis, x_axis))
+    return np.stack([x_axis, y_axis, z_axis], axis=-1)
+
+def align_hands(last_hands, curr_poses, part_type):
+    """Batched `align_hand_landmarks`: (B, 21, 3) hands, (B, 25, 3) poses."""
+    wrist_idx, index_idx, pinky_idx = HAND_POSE_NODES[part_type]
+
+    wrist_prev = last_hands[:, 0]
+    R_prev = hand_rotation_matrices(wrist_prev, last_hands[:, 5], last_hands[:, 17])
+
+    wrist_curr = curr_poses[:, wrist_idx]
+    R_curr = hand_rotation_matrices(wrist_curr, curr_poses[:, index_idx], curr_poses[:, pinky_idx])
+
+    # Rotation from prev -> curr
+    R = R_curr @ R_prev.transpose(0, 2, 1)
+
+    # Center on the previous wrist, rotate and move to the current wrist
+    centered = last_hands - wrist_prev[:, None]
+    return centered @ R.transpose(0, 2, 1) + wrist_curr[:, None]
+
+
+# ----- Normalization -----
+def normalize_frames(frames):
+    """In-place batched `normalize_landmarks` on (B, 67, 3)."""
+    pose = frames[:, PART_SLICES['pose']]
+    left_shoulder, right_shoulder = pose[:, LEFT_SHOULDER], pose[:, RIGHT_SHOULDER]
+
+    # shoulder center
+    root = (left_shoulder + right_shoulder) / 2.0
+    shoulder_diff = left_shoulder - right_shoulder
+    scale = np.sqrt(np.einsum('ij,ij->i', shoulder_diff, shoulder_diff))
+
+    # avoid division by 0
+    scale[scale < 1e-6] = 1.0
+
+    frames -= root[:, None]
+    frames /= scale[:, None, None]
+
+    # Move each hand's wrist onto the pose wrist
+    for part_type, root_idx in HAND_ROOT_NODES.items():
+        hand = frames[:, PART_SLICES[part_type]]
+        hand += (pose[:, root_idx] - hand[:, 0])[:, None]
+
+    return frames
+
+
+# ----- Correction -----
+def correct_filled_frames(filled, presence, out=None):
+    """
+    filled: (B, 67, 3) where every missing part already holds its last seen value
+    presence: (B, 3) bool mask in PARTS order
+    Missing hands are aligned to the current pose, then everything is normalized.
+    """
+    if out is None:
+        out = np.empty(filled.shape, dtype=np.float32)
+
+    out[:] = filled
+    poses = filled[:, PART_SLICES['pose']]
+
+    for i, part_type in enumerate(PARTS[:2]):
+        missing = ~presence[:, i]
+
+        if missing.any():
+            part_slice = PART_SLICES[part_type]
+            out[missing, part_slice] = align_hands(filled[missing, part_slice], poses[missing], part_type)
+
+    return normalize_frames(out)
+
+def correct_sessions(frames, presence, prev, out=None):
+    """
+    One frame for each of B sessions. prev (B, 67, 3) holds each session's last raw
+    landmarks and is updated in place with the present parts.
+    """
+    for i, part_type in enumerate(PARTS):
+        part_slice = PART_SLICES[part_type]
+        present = presence[:, i]
+        prev[present, part_slice] = frames[present, part_slice]
+
+    return correct_filled_frames(prev, presence, out)
+
+def correct_sequence(frames, presence, prev, out=None):
+    """
+    T consecutive frames of one session. Missing parts are forward-filled from the last
+    frame they were seen in (or from prev, (67, 3)), which is updated in place.
+    """
+    num_frames = len(frames)
+    filled = np.empty((num_frames, NUM_NODES, 3), dtype=np.float32)
+    steps = np.arange(num_frames)
+
+    for i, part_type in enumerate(PARTS):
+        part_slice = PART_SLICES[part_type]
+
+        # Index of the last frame with this part present, -1 before the first one
+        last_seen = np.maximum.accumulate(np.where(presence[:, i], steps, -1))
+        seen = last_seen >= 0
+
+        filled[seen, part_slice] = frames[last_seen[seen], part_slice]
+        filled[~seen, part_slice] = prev[part_slice]
+
+        if seen.any():
+            prev[part_slice] = filled[-1, part_slice]
+
+    return correct_filled_frames(filled, presence, out)
+
+def correct_frame(landmarks, prev_landmarks):
+    """Single-frame, dict-based entry point used by `correct_landmarks`."""
+    frame, presence = landmarks_dict_to_frame(landmarks, prev_landmarks)
+    corrected = correct_filled_frames(frame[None], presence[None])
+    return torch.from_numpy(corrected[0])
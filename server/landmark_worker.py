@@ -0,0 +1,269 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+from landmark_extracter import create_holistic, extract_landmarks
+from landmark_postprocess import PARTS, NUM_NODES, landmarks_dict_to_frame
+from frame_handler import FrameDecoder, decode_frame, decode_frame_bytes
+from quality_controller import QUALITY_TIERS, QUALITY_MAX_TIER
+from metrics import frame_decode_seconds, landmark_extraction_seconds, landmark_worker_seconds
+from session_manager import available_cpus
+
+NUM_LANDMARK_WORKERS = int(os.getenv("LANDMARK_WORKERS", math.ceil(available_cpus())))
+LANDMARK_WARM_UP = os.getenv("LANDMARK_WARM_UP", "1") == "1"  # 0: start workers without loading MediaPipe models
+
+# ----- Worker Process Side -----
+# One Holistic tracker per session, living in the worker process the session is pinned to,
+# session_id -> (holistic, model_complexity)
+session_holistics = {}
+# session_id -> FrameDecoder, reusing the session's frame buffer
+session_decoders = {}
+
+def get_session_holistic(session_id, model_complexity=2):
+    holistic, complexity = session_holistics.get(session_id, (None, None))
+
+    if complexity != model_complexity:
+        # Quality tier changed, tracking restarts with the new model
+        if holistic is not None:
+            holistic.close()
+
+        holistic = create_holistic(model_complexity)
+        session_holistics[session_id] = (holistic, model_complexity)
+
+    return holistic
+
+def extract_session_landmarks(session_id, frame_data, tier=0):
+    """
+    Decodes a frame (binary message or base64 data-URL) and extracts its landmarks
+    with the session's own tracker, at the given QUALITY_TIERS tier.
+    Returns (landmarks, decode_seconds, extract_seconds, cpu_seconds), the timings are recorded
+    by the event loop side since metrics live in the server process. cpu_seconds is the CPU
+    time of the worker process (MediaPipe's own threads included) spent on this frame.
+    """
+    model_complexity, size = QUALITY_TIERS[tier]
+
+    decoder = session_decoders.get(session_id)
+    if decoder is None:
+        decoder = session_decoders[session_id] = FrameDecoder()
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    if isinstance(frame_data, bytes):
+        frame = decode_frame_bytes(frame_data, size, decoder)
+    else:
+        frame = decode_frame(frame_data, size, decoder)
+    decoded = time.perf_counter()
+
+    if frame is None:
+        return None, decoded - start, 0.0, time.process_time() - cpu_start
+
+    landmarks = extract_landmarks(frame, get_session_holistic(session_id, model_complexity))
+    return landmarks, decoded - start, time.perf_counter() - decoded, time.process_time() - cpu_start
+
+def close_session_holistic(session_id):
+    session_decoders.pop(session_id, None)
+    holistic, _ = session_holistics.pop(session_id, (None, None))
+
+    if holistic is not None:
+        holistic.close()
+
+def warm_up_worker():
+    """
+    Imports MediaPipe and tracks one blank frame with every model complexity in use,
+    so neither the first session nor the first tier change pays for loading it.
+    """
+    for model_complexity in sorted({complexity for complexity, _ in QUALITY_TIERS[:QUALITY_MAX_TIER + 1]}):
+        holistic = create_holistic(model_complexity)
+
+        try:
+            extract_landmarks(np.zeros((480, 640, 3), dtype=np.uint8), holistic)
+        finally:
+            holistic.close()
+
+def extract_video_chunk(path, start, stop, step, warmup):
+    """
+    Streams raw frames [start, stop) of a video file (stop=None reads to the end), keeping
+    every step-th one, and extracts landmarks with a fresh tracker. The `warmup` sampled
+    frames before start are only tracked, so tracking is continuous across chunk borders.
+    Returns (frames (N, 67, 3), presence (N, 3), raw frame indices (N,)).
+    """
+    capture = cv2.VideoCapture(path)
+    holistic = create_holistic()
+    empty = np.zeros((NUM_NODES, 3), dtype=np.float32)
+
+    frames, presences, indices = [], [], []
+
+    try:
+        index = max(0, start - warmup * step)
+        capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+
+        while stop is None or index < stop:
+            if index % step:
+                # grab() skips the colour conversion of frames we don't use
+                if not capture.grab():
+                    break
+                index += 1
+                continue
+
+            ok, frame = capture.read()
+            if not ok:
+                break
+
+            frame = cv2.cvtColor(cv2.resize(frame, (640, 480)), cv2.COLOR_BGR2RGB)
+            landmarks = extract_landmarks(frame, holistic)
+
+            if index >= start:
+                frame, presence = landmarks_dict_to_frame(landmarks, empty)
+                frames.append(frame)
+                presences.append(presence)
+                indices.append(index)
+
+            index += 1
+    finally:
+        capture.release()
+        holistic.close()
+
+    if len(frames) == 0:
+        return (np.empty((0, NUM_NODES, 3), dtype=np.float32),
+                np.empty((0, len(PARTS)), dtype=bool), np.empty(0, dtype=np.int64))
+
+    return np.stack(frames), np.stack(presences), np.array(indices)
+
+
+# ----- Event Loop Side -----
+class LandmarkWorkerPool:
+    """
+    Pool of single-process workers. Each session is pinned to one worker for its
+    lifetime so its Holistic tracking state stays consistent across frames. A worker
+    process that dies (e.g. a MediaPipe crash) is replaced the first time it is used;
+    its sessions stay pinned to the new process and restart tracking there.
+    """
+    def __init__(self, num_workers=NUM_LANDMARK_WORKERS):
+        self.num_workers = max(1, num_workers)
+        self.workers = None
+        self.restarts = 0
+        self.session_workers = {}
+        self.worker_sessions = [0] * self.num_workers
+        # Video chunks run at most one per worker, so live frames queue behind one chunk at most
+        self.video_slots = asyncio.Semaphore(self.num_workers)
+        self.video_busy = set()
+
+    def start(self):
+        if self.workers is None:
+            self.workers = [self.create_worker() for _ in range(self.num_workers)]
+
+    def create_worker(self):
+        # spawn avoids forking torch/mediapipe threads of the server process
+        return ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+    def respawn(self, worker_id, broken):
+        """Replaces a dead worker process, unless another caller already has."""
+        if self.workers is None or self.workers[worker_id] is not broken:
+            return
+
+        print(f"Landmark worker {worker_id} died, restarting it ({self.worker_sessions[worker_id]} sessions pinned)")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.workers[worker_id] = self.create_worker()
+        self.restarts += 1
+
+    async def run(self, worker_id, fn, *args):
+        """Runs fn(*args) on a worker. If its process has died, it is respawned and fn retried once."""
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(2):
+            worker = self.workers[worker_id]
+            try:
+                return await loop.run_in_executor(worker, fn, *args)
+            except BrokenProcessPool:
+                self.respawn(worker_id, worker)
+                if attempt > 0:
+                    raise
+
+    def open_session(self, session_id):
+        self.start()
+
+        # Pin to the least loaded worker
+        worker_id = min(range(self.num_workers), key=lambda i: self.worker_sessions[i])
+        self.session_workers[session_id] = worker_id
+        self.worker_sessions[worker_id] += 1
+
+    def close_session(self, session_id):
+        worker_id = self.session_workers.pop(session_id, None)
+
+        if worker_id is None:
+            return
+
+        self.worker_sessions[worker_id] -= 1
+
+        worker = self.workers[worker_id]
+        try:
+            worker.submit(close_session_holistic, session_id)
+        except BrokenProcessPool:
+            # Its tracker died with the process
+            self.respawn(worker_id, worker)
+
+    async def extract(self, session_id, frame_data, tier=0):
+        """
+        Returns (landmarks, cpu_seconds): the extracted landmarks dict, or None if the frame
+        could not be decoded, and the CPU time the worker spent on it (without queueing and IPC).
+        """
+        if session_id not in self.session_workers:
+            self.open_session(session_id)
+
+        start = time.perf_counter()
+        landmarks, decode_time, extract_time, cpu_time = await self.run(
+            self.session_workers[session_id], extract_session_landmarks, session_id, frame_data, tier
+        )
+
+        landmark_worker_seconds.observe(time.perf_counter() - start)
+        frame_decode_seconds.observe(decode_time)
+        if landmarks is not None:
+            landmark_extraction_seconds.observe(extract_time)
+
+        return landmarks, cpu_time
+
+    async def warm_up(self):
+        """Starts every worker process and waits until each one can extract landmarks (with LANDMARK_WARM_UP)."""
+        self.start()
+
+        if not LANDMARK_WARM_UP:
+            return
+
+        await asyncio.gather(*[self.run(worker_id, warm_up_worker) for worker_id in range(self.num_workers)])
+
+    async def extract_video(self, path, chunks, step, warmup):
+        """
+        Runs extract_video_chunk for each (start, stop) chunk and returns the per-chunk results
+        in order. Workers are shared with live sessions, so across all uploads only one chunk
+        runs on a worker at a time, preferring workers with the fewest live sessions. A live
+        frame then waits for one chunk at most.
+        """
+        self.start()
+
+        async def run_chunk(start, stop):
+            async with self.video_slots:
+                worker_id = min(
+                    (i for i in range(self.num_workers) if i not in self.video_busy),
+                    key=lambda i: self.worker_sessions[i],
+                )
+                self.video_busy.add(worker_id)
+
+                try:
+                    return await self.run(worker_id, extract_video_chunk, path, start, stop, step, warmup)
+                finally:
+                    self.video_busy.discard(worker_id)
+
+        return await asyncio.gather(*[run_chunk(start, stop) for start, stop in chunks])
+
+    def shutdown(self):
+        if self.workers is not None:
+            for worker in self.workers:
+                worker.shutdown(wait=False, cancel_futures=True)
+            self.workers = None
@@ -1,15 +1,82 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File
 from starlette.websockets import WebSocketState
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 import asyncio
+import math
+import os
 import time
+import uuid
+
+from landmark_extracter import default_landmarks, correct_landmarks
+from word_level_model import load_word_model, EmbeddingFrameBuffer, WORD_MODEL_FILE
+from inference_backends import create_inference_backend, WORD_MODEL_BACKEND
+from inference_scheduler import InferenceScheduler
+from startup import StartupTracker, warm_up_word_model
+from motion_gate import MotionGate, gate_totals
+from quality_controller import QualityController, QUALITY_TIERS, QUALITY_LATENCY_BUDGET, quality_totals
+from landmark_worker import LandmarkWorkerPool
+from text_language_generator import generate_continue_text, stream_continue_text, GlossBuffer, create_text_buffer, text_cache, text_dispatcher
+from video_translator import translate_video, save_upload, VIDEO_SAMPLE_FPS
+from session_recorder import open_session_recorder
+from session_manager import SessionManager
+from frame_handler import FrameIntake, decode_landmark_packet, frame_sequence, intake_totals
+from landmark_postprocess import landmarks_dict_to_frame
+from metrics import CallbackMetric, render_prometheus, active_sessions, frame_age_seconds, landmark_correction_seconds
+
+# Heavy components load in the background after the server starts, see /ready
+startup = StartupTracker()
+word_model = None
+inference_scheduler = InferenceScheduler(None)
+landmark_pool = LandmarkWorkerPool()
+session_manager = SessionManager()
+thres_word_conf = 0.75
+
+# Landmarks a new session starts from, as a (67, 3) frame
+default_frame, _ = landmarks_dict_to_frame(default_landmarks, None)
+
+def load_inference_model():
+    with startup.stage('load_word_model'):
+        model = load_word_model(WORD_MODEL_FILE)
+
+    with startup.stage('create_inference_backend'):
+        model = create_inference_backend(model, WORD_MODEL_BACKEND)
+
+    with startup.stage('warm_up_word_model'):
+        warm_up_word_model(model)
+
+    return model
+
+async def warm_up_landmark_workers():
+    with startup.stage('warm_up_landmark_workers'):
+        await landmark_pool.warm_up()
+
+async def start_components():
+    global word_model
+
+    try:
+        model, _ = await asyncio.gather(asyncio.to_thread(load_inference_model), warm_up_landmark_workers())
+
+        word_model = model
+        inference_scheduler.model = model
+        startup.mark_ready()
+
+    except Exception as e:
+        print(f"Error Starting Server: {e}")
+        startup.fail(e)
 
-from landmark_extracter import extract_landmarks, process_frame, default_landmarks, correct_landmarks
-from word_level_model import load_word_model, predict_word_gloss
-from text_language_generator import generate_continue_text, GlossBuffer, create_text_buffer
-from frame_handler import FrameBuffer, decode_frame, decode_image_file
+@asynccontextmanager
+async def lifespan(app):
+    loader = asyncio.create_task(start_components())
+    yield
+    loader.cancel()
+    inference_scheduler.stop()
+    text_dispatcher.stop()
+    session_manager.stop()
+    landmark_pool.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS Handler
 app.add_middleware(
@@ -20,42 +87,117 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-word_model = load_word_model('saved_models/word_level_model_states_include.pth')
-thres_word_conf = 0.75
-INFERENCE_INTERVAL = 0.2  # 0.2 seconds
+# Frame message formats on /ws, chosen with ?protocol=
+# text: base64 data-URL per text message (default, old clients)
+# binary: FRAME_HEADER + raw JPEG/WebP bytes per binary message
+# landmarks: client runs MediaPipe and sends one landmark packet per binary message
+WS_PROTOCOLS = ('text', 'binary', 'landmarks')
+
+# Send generated sentences as they stream in (per connection: ?stream=0/1)
+TEXT_STREAMING = os.getenv("TEXT_STREAMING", "1") == "1"
+
+# ----- Metrics -----
+def stats_series(stats):
+    return [({'stat': key}, value) for key, value in stats.items()]
+
+def buffer_depths():
+    # Sessions admitted from the queue get their buffers when their endpoint resumes
+    sessions = [session for session in session_manager.sessions.values() if session.frame_intake is not None]
+    return [
+        ({'buffer': 'frames'}, sum(len(session.frame_buffer) for session in sessions)),
+        ({'buffer': 'glosses'}, sum(len(session.gloss_buffer.buffer) for session in sessions)),
+        ({'buffer': 'intake'}, sum(session.frame_intake.latest is not None for session in sessions)),
+    ]
+
+def quality_tier_sessions():
+    tiers = [session.quality.tier for session in session_manager.sessions.values() if session.quality is not None]
+    return [({'tier': tier}, tiers.count(tier)) for tier in range(len(QUALITY_TIERS))]
+
+def protocol_sessions():
+    protocols = [session.protocol for session in session_manager.sessions.values()]
+    return [({'protocol': protocol}, protocols.count(protocol)) for protocol in WS_PROTOCOLS]
+
+def session_cpu_costs():
+    return [({'protocol': protocol}, session_manager.estimate(protocol)) for protocol in WS_PROTOCOLS]
+
+CallbackMetric('slt_buffer_depth', 'Items held in per-session buffers, summed over sessions', buffer_depths)
+CallbackMetric('slt_inference_scheduler', 'InferenceScheduler stats', lambda: stats_series(inference_scheduler.get_stats()), 'untyped')
+CallbackMetric('slt_motion_gate_total', 'Motion gate decisions over all sessions', lambda: stats_series(gate_totals), 'counter')
+CallbackMetric('slt_frame_intake', 'Frame intake stats over all sessions', lambda: stats_series(intake_totals), 'untyped')
+CallbackMetric('slt_text_cache', 'Generation cache stats', lambda: stats_series(text_cache.get_stats()), 'untyped')
+CallbackMetric('slt_text_dispatcher', 'Cross-session text generation batching stats', lambda: stats_series(text_dispatcher.get_stats()), 'untyped')
+CallbackMetric('slt_quality_tier_sessions', 'Sessions at each landmark quality tier (0 = best)', quality_tier_sessions)
+CallbackMetric('slt_quality_changes_total', 'Landmark quality tier changes over all sessions', lambda: stats_series(quality_totals), 'counter')
+CallbackMetric('slt_session_manager', 'Session admission, eviction and state size stats', lambda: stats_series(session_manager.get_stats()), 'untyped')
+CallbackMetric('slt_protocol_sessions', 'Sessions using each websocket protocol', protocol_sessions)
+CallbackMetric('slt_session_cpu_cost', 'Expected CPU cores of a new session, measured per protocol', session_cpu_costs)
+CallbackMetric('slt_landmark_worker_sessions', 'Sessions pinned to each landmark worker',
+               lambda: [({'worker': i}, count) for i, count in enumerate(landmark_pool.worker_sessions)])
+CallbackMetric('slt_landmark_worker_restarts_total', 'Landmark worker processes replaced after dying', lambda: landmark_pool.restarts, 'counter')
 
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "Sign Language Translator is running on Hugging Face Spaces"}
 
-def gloss_prediction(frameData, frame_buffer, gloss_buffer, prev_lm, counter):
+@app.get("/ready")
+async def ready():
+    # 503 until the word model and landmark workers are loaded and warmed up
+    return JSONResponse(startup.get_status(), status_code=200 if startup.ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+async def frame_landmarks(session, frameData):
+    if session.protocol == 'landmarks':
+        # Already extracted by the client, skip decoding and MediaPipe
+        return decode_landmark_packet(frameData)
+
+    # Decode and extract landmarks in the session's worker process, at its quality tier
+    start = time.perf_counter()
+    landmarks, cpu_seconds = await landmark_pool.extract(session.session_id, frameData, session.quality.tier)
+    session.quality.update(time.perf_counter() - start)
+    session.cpu_seconds += cpu_seconds
+
+    return landmarks
+
+async def gloss_prediction(session, frameData):
     """Receives frames, predicts glosses, and fills buffer."""
     try:
-        frame = decode_frame(frameData)
+        curr_lm = await frame_landmarks(session, frameData)
 
-        if frame is None:
+        if curr_lm is None:
             return {"status": "error", "message": "Invalid frame data"}
 
-        # Extract and correct landmarks
-        curr_lm = extract_landmarks(frame)
-        corrected_lm = correct_landmarks(curr_lm, prev_lm)
-        prev_lm.update(curr_lm)
+        # One clock reading per frame, so a replay of the recording gates inference identically
+        now = time.time()
+        # CPU time of the event loop thread, so waiting on other sessions isn't charged to this one
+        cpu_start = time.thread_time()
+
+        # Raw landmarks, so a replay goes through the same correction
+        if session.recorder is not None:
+            session.recorder.record_frame(curr_lm, now)
 
-        frame_buffer.add_frame(corrected_lm)
+        # Correct landmarks
+        with landmark_correction_seconds.time():
+            corrected_lm = correct_landmarks(curr_lm, session.prev_lm)
+        landmarks_dict_to_frame(curr_lm, session.prev_lm, out=session.prev_lm)
 
-        frame_seq = frame_buffer.get_frames()
+        session.frame_buffer.add_frame(corrected_lm)
+        session.motion_gate.update(corrected_lm, 'left_hand' in curr_lm or 'right_hand' in curr_lm, now=now)
 
-        if len(frame_seq) == 0 or time.time() - counter['last_inference_time'] < INFERENCE_INTERVAL:
-            # Not enough frames yet or recently predicted gloss
+        # Frames are encoded on arrival, only the sequence classifier runs per inference
+        frame_seq = session.frame_buffer.get_embeddings()
+        session.cpu_seconds += time.thread_time() - cpu_start
+
+        if len(frame_seq) == 0 or not session.motion_gate.should_infer(now=now):
+            # Not enough frames yet, recently predicted gloss, signer idle or no hands
             return None
         
-        counter['last_inference_time'] = time.time()
-        
-        word_gloss, word_conf = predict_word_gloss(word_model, frame_seq)
-        print(f"Predicted Word Gloss: {word_gloss} with confidence {word_conf}")
+        word_gloss, word_conf = await inference_scheduler.predict(frame_seq, embedded=True)
 
         if word_conf >= thres_word_conf:
-            gloss_buffer.append_gloss(word_gloss)
+            session.gloss_buffer.append_gloss(word_gloss)
 
         # text = generate_continue_text(text_buffer, gloss_buffer)
         # text = word_gloss + " " + sentence_gloss
@@ -71,10 +213,10 @@ def gloss_prediction(frameData, frame_buffer, gloss_buffer, prev_lm, counter):
         return {"status": "error", "message": str(e)}
 
 
-def text_generation(gloss_buffer, text_buffer, counter):
+async def text_generation(gloss_buffer, text_buffer, counter):
     """Reads glosses and generates text asynchronously."""
     try:
-        gen_text = generate_continue_text(gloss_buffer, text_buffer, counter)
+        gen_text = await generate_continue_text(gloss_buffer, text_buffer, counter)
 
         if gen_text:
             text_buffer.extend(gen_text.split())
@@ -86,50 +228,193 @@ def text_generation(gloss_buffer, text_buffer, counter):
         return {"status": "error", "message": str(e)}
 
 
+async def stream_text_generation(websocket, gloss_buffer, text_buffer, counter):
+    """
+    Like text_generation, but sends the sentence while it is generated: a "partial" message
+    with the text so far after every change, then the usual text message as the commit.
+    """
+    async for gen_text, final in stream_continue_text(gloss_buffer, text_buffer, counter):
+        if websocket.client_state == WebSocketState.DISCONNECTED:
+            break
+
+        if final:
+            await websocket.send_json({"status": "success", "result": {"text": gen_text}})
+        else:
+            await websocket.send_json({"status": "partial", "result": {"partial_text": gen_text}})
+
+
+def query_flag(query_params, name, default):
+    value = query_params.get(name, default)
+    if value not in ('0', '1'):
+        raise ValueError(f"Invalid {name} '{value}', expected 0 or 1")
+    return value == '1'
+
+def session_options(query_params):
+    """(latency budget in seconds, streaming, ack) from the websocket query. ValueError on a bad value."""
+    # Clients may ask for a tighter (or looser) per-frame latency budget
+    value = query_params.get('latency_budget_ms', QUALITY_LATENCY_BUDGET * 1000)
+    try:
+        latency_budget = float(value) / 1000
+    except ValueError:
+        latency_budget = math.nan
+    if not 0 < latency_budget < math.inf:
+        raise ValueError(f"Invalid latency_budget_ms '{value}'")
+
+    streaming = query_flag(query_params, 'stream', '1' if TEXT_STREAMING else '0')
+    # Acknowledge every processed frame, for load testing
+    ack = query_flag(query_params, 'ack', '0')
+
+    return latency_budget, streaming, ack
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    protocol = websocket.query_params.get('protocol', 'text')
+
     await websocket.accept()
-    print("Client connected")
 
-    frame_buffer = FrameBuffer(max_size=25)
-    gloss_buffer = GlossBuffer()
-    text_buffer = create_text_buffer()
+    if protocol not in WS_PROTOCOLS:
+        await websocket.close(code=1003, reason=f"Unsupported protocol '{protocol}'")
+        return
 
-    prev_lm = default_landmarks.copy()
+    if not startup.ready:
+        await websocket.close(code=1013, reason="Server is starting, retry later")
+        return
 
-    counter = {'last_inference_time': time.time(), 'last_text_time': time.time()}
+    # Bad options are turned away before the session takes any capacity
+    try:
+        latency_budget, streaming, ack = session_options(websocket.query_params)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    session_id = uuid.uuid4().hex
+
+    # Admission control: take the session only while the server has CPU to spare for it
+    session = session_manager.try_admit(session_id, protocol)
+    if session is None:
+        if session_manager.admission_timeout > 0:
+            await websocket.send_json({"status": "queued", "result": {"position": len(session_manager.waiting) + 1}})
+        session = await session_manager.wait_admit(session_id, protocol)
+
+    if session is None:
+        await websocket.close(code=1013, reason="Server is at capacity, retry later")
+        return
+
+    print(f"Client connected ({protocol} protocol)")
+
+    async def receive_loop(websocket):
+        if protocol in ('binary', 'landmarks'):
+            messages = websocket.iter_bytes()
+        else:
+            messages = websocket.iter_text()
+
+        try:
+            async for frame_data in messages:
+                session_manager.frame_received(session)
+                # Replaces any frame still waiting to be processed
+                session.frame_intake.put(frame_data)
+        finally:
+            session.frame_intake.close()
+
+    async def gloss_prediction_loop(websocket):
+        frame_intake = session.frame_intake
+
+        while True:
+            item = await frame_intake.get()
+
+            if item is None:
+                break
 
-    async def gloss_prediction_loop(websocket, frame_buffer, gloss_buffer):
-        async for frame_data in websocket.iter_text():
-            res = gloss_prediction(frame_data, frame_buffer, gloss_buffer, prev_lm, counter)
+            frame_data, age = item
+            frame_age_seconds.observe(age)
+            res = await gloss_prediction(session, frame_data)
+            session_manager.frame_processed(session)
 
             if res is not None:
                 await websocket.send_json(res)
 
-    async def text_generation_loop(websocket, gloss_buffer, text_buffer):
+            if ack:
+                await websocket.send_json({"status": "ack", "result": {"frame_id": frame_sequence(frame_data)}})
+
+            # Ask the client to lower (or raise again) its send rate
+            fps_hint = frame_intake.rate_hint()
+            if fps_hint is not None:
+                await websocket.send_json({"status": "rate", "result": {"max_fps": fps_hint}})
+
+            # Tell the client when its landmark quality tier changed
+            tier_hint = session.quality.tier_hint() if session.quality is not None else None
+            if tier_hint is not None:
+                await websocket.send_json({"status": "quality", "result": tier_hint})
+
+    async def text_generation_loop(websocket):
+        gloss_buffer, text_buffer, counter = session.gloss_buffer, session.text_buffer, session.counter
+
         while websocket.client_state == WebSocketState.CONNECTED:
             await asyncio.sleep(1.5)  # Check every second
 
             if websocket.client_state == WebSocketState.DISCONNECTED:
                 break
-            
-            res = text_generation(gloss_buffer, text_buffer, counter)
+
+            if streaming:
+                await stream_text_generation(websocket, gloss_buffer, text_buffer, counter)
+                continue
+
+            res = await text_generation(gloss_buffer, text_buffer, counter)
 
             if websocket.client_state == WebSocketState.DISCONNECTED:
                 break
 
             await websocket.send_json(res)
 
-    producer_task = asyncio.create_task(gloss_prediction_loop(websocket, frame_buffer, gloss_buffer))
-    consumer_task = asyncio.create_task(text_generation_loop(websocket, gloss_buffer, text_buffer))
+    active_sessions.inc()
+    tasks = []
 
     try:
-        await asyncio.gather(producer_task, consumer_task)
+        if protocol != 'landmarks':
+            landmark_pool.open_session(session_id)
+            session.quality = QualityController(latency_budget)
+
+        session.frame_buffer = EmbeddingFrameBuffer(word_model, max_size=25)
+        session.gloss_buffer = GlossBuffer()
+        session.text_buffer = create_text_buffer()
+
+        session.prev_lm = default_frame.copy()
+
+        session.counter = {'last_text_time': time.time()}
+        session.motion_gate = MotionGate()
+        session.frame_intake = FrameIntake()
+        # Opt-in, see SESSION_RECORD_DIR
+        session.recorder = open_session_recorder(session_id)
+
+        receiver_task = asyncio.create_task(receive_loop(websocket))
+        producer_task = asyncio.create_task(gloss_prediction_loop(websocket))
+        consumer_task = asyncio.create_task(text_generation_loop(websocket))
+        eviction_task = asyncio.create_task(session.evicted.wait())
+        tasks = [receiver_task, producer_task, consumer_task, eviction_task]
+
+        done, _ = await asyncio.wait([producer_task, consumer_task, eviction_task], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
     except WebSocketDisconnect:
         print("Client disconnected")
     finally:
-        producer_task.cancel()
-        consumer_task.cancel()
+        # Also cancels an in-flight text generation once the client is gone
+        for task in tasks:
+            task.cancel()
+        landmark_pool.close_session(session_id)
+        if session.recorder is not None:
+            session.recorder.close()
+
+        session_manager.release(session)
+        active_sessions.dec()
+
+    if session.evict_reason is not None:
+        print(f"Evicting {session.evict_reason} session")
+        try:
+            await websocket.close(code=1001, reason=f"Session {session.evict_reason}")
+        except Exception:
+            # Client is already gone
+            pass
 
 
 @app.post('/upload-image')
@@ -152,4 +437,25 @@ async def upload_image(image: UploadFile = File(...)):
         return {"status": "success", "result": response}
     
     except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
+
+
+@app.post('/translate-video')
+async def translate_video_upload(video: UploadFile = File(...), sample_fps: float = VIDEO_SAMPLE_FPS, text: bool = False):
+    """Offline translation of a recorded video into a timestamped gloss timeline (and a sentence with text=true)."""
+    if not startup.ready:
+        return JSONResponse({"status": "error", "message": "Server is starting, retry later"}, status_code=503)
+
+    try:
+        path = await save_upload(video)
+
+        try:
+            result = await translate_video(path, word_model, landmark_pool, thres_word_conf, sample_fps, text)
+        finally:
+            os.remove(path)
+
+        return {"status": "success", "result": result}
+
+    except Exception as e:
+        print(f"Error Translating Video: {e}")
+        return {"status": "error", "message": str(e)}
@@ -0,0 +1,156 @@
+from bisect import bisect_left
+import os
+import time
+
+# Lightweight in-process metrics, rendered in Prometheus text format on /metrics.
+# Recording is a bisect and a few increments, cheap enough to leave on under load.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+registry = []
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        registry.append(self)
+
+    def observe(self, value):
+        # First bucket with upper bound >= value, the last slot is +Inf
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return Timer(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f'{self.name}_sum {self.sum}')
+        lines.append(f'{self.name}_count {self.count}')
+        return '\n'.join(lines)
+
+
+class Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Gauge:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        registry.append(self)
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def render(self):
+        return f'# HELP {self.name} {self.help}\n# TYPE {self.name} gauge\n{self.name} {self.value}'
+
+
+class CallbackMetric:
+    """
+    Value read at scrape time from existing state, e.g. a stats dict. `callback` returns
+    a number, or a list of (labels dict, number) for labelled series.
+    """
+    def __init__(self, name, help, callback, metric_type='gauge'):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.metric_type = metric_type
+        registry.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.metric_type}']
+
+        value = self.callback()
+        if isinstance(value, list):
+            lines.extend(f'{self.name}{format_labels(labels)} {v}' for labels, v in value)
+        else:
+            lines.append(f'{self.name} {value}')
+
+        return '\n'.join(lines)
+
+
+# ----- Process Memory -----
+SMAPS_FIELDS = {
+    'Rss': 'rss',
+    'Pss': 'pss',  # shared pages split between the processes mapping them
+    'Shared_Clean': 'shared_clean',
+    'Private_Clean': 'private_clean',
+    'Private_Dirty': 'private_dirty',
+}
+
+def read_smaps_rollup(pid='self'):
+    """Memory of a process in bytes from /proc/<pid>/smaps_rollup, {} where it isn't available."""
+    memory = {}
+
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                field, _, value = line.partition(':')
+                if field in SMAPS_FIELDS:
+                    memory[SMAPS_FIELDS[field]] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+
+    return memory
+
+
+def render_prometheus():
+    return '\n'.join(metric.render() for metric in registry) + '\n'
+
+
+# ----- Pipeline Metrics -----
+frame_decode_seconds = Histogram('slt_frame_decode_seconds', 'Frame decode time (in the landmark worker)')
+landmark_extraction_seconds = Histogram('slt_landmark_extraction_seconds', 'MediaPipe landmark extraction time (in the landmark worker)')
+landmark_worker_seconds = Histogram('slt_landmark_worker_seconds', 'Landmark worker round trip, including queueing and IPC')
+landmark_correction_seconds = Histogram('slt_landmark_correction_seconds', 'correct_landmarks time')
+model_inference_seconds = Histogram('slt_model_inference_seconds', 'Batched word model forward pass time')
+inference_batch_size = Histogram('slt_inference_batch_size', 'Windows per batched forward pass', BATCH_SIZE_BUCKETS)
+text_batch_size = Histogram('slt_text_batch_size', 'Distinct gloss inputs per batched text generation call', BATCH_SIZE_BUCKETS)
+inference_queue_wait_seconds = Histogram('slt_inference_queue_wait_seconds', 'Time a window waited in the inference scheduler')
+frame_age_seconds = Histogram('slt_frame_age_seconds', 'Time a frame waited in the session intake before processing')
+text_generation_seconds = Histogram('slt_text_generation_seconds', 'Gloss-to-text backend call time (cache misses only)')
+text_first_token_seconds = Histogram('slt_text_first_token_seconds', 'Time until a streamed generation shows its first text (cache misses only)')
+
+active_sessions = Gauge('slt_active_sessions', 'Connected websocket sessions')
+
+CallbackMetric('slt_process_memory_bytes', 'Memory of this server process (pid label), from smaps_rollup',
+               lambda: [({'pid': os.getpid(), 'kind': kind}, value) for kind, value in read_smaps_rollup().items()])
@@ -0,0 +1,174 @@
+import argparse
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+
+import torch
+from huggingface_hub import hf_hub_download
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "model_cache")
+MODEL_OFFLINE = os.getenv("MODEL_OFFLINE", "0") == "1"  # never fall back to the Hub
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def write_atomic(path, data):
+    """Readers see either the old or the new file, never a partial one."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), delete=False) as f:
+        f.write(data)
+
+    os.replace(f.name, path)
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive lock across processes (no-op where fcntl is unavailable)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def convert_state_dict(source_path, target_path):
+    """
+    Re-saves a state dict in torch's zip format with one contiguous storage per tensor,
+    which torch.load(mmap=True) maps in place instead of copying.
+    """
+    state_dict = torch.load(source_path, map_location='cpu', weights_only=True)
+    state_dict = {key: value.contiguous().clone() for key, value in state_dict.items()}
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(target_path), delete=False) as f:
+        torch.save(state_dict, f)
+
+    os.replace(f.name, target_path)
+
+
+# Content-Addressed Model Cache
+class ModelStore:
+    """
+    Local model artifact cache. blobs/<sha256> holds file contents, refs/<repo_id>/<filename>
+    holds the sha256 that name currently resolves to, mmap/<sha256>.pt the mappable copy of a
+    state dict blob. Files are never modified once written, so several server processes can
+    read and fill the store without locking.
+    """
+    def __init__(self, root=MODEL_CACHE_DIR, offline=MODEL_OFFLINE):
+        self.root = root
+        self.offline = offline
+
+    def ref_path(self, repo_id, filename):
+        return os.path.join(self.root, 'refs', repo_id, filename)
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest)
+
+    def mmap_path(self, digest):
+        return os.path.join(self.root, 'mmap', f'{digest}.pt')
+
+    def lookup(self, repo_id, filename):
+        """Cached blob path for a Hub file, or None."""
+        try:
+            with open(self.ref_path(repo_id, filename)) as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        path = self.blob_path(digest)
+        return path if os.path.exists(path) else None
+
+    def add(self, repo_id, filename, source_path):
+        """Copies a file into the store under repo_id/filename, returns its blob path."""
+        digest = file_sha256(source_path)
+        path = self.blob_path(digest)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+                with open(source_path, 'rb') as source:
+                    shutil.copyfileobj(source, f, HASH_CHUNK_SIZE)
+
+            os.replace(f.name, path)
+
+        write_atomic(self.ref_path(repo_id, filename), digest)
+        return path
+
+    def resolve(self, repo_id, filename):
+        """Local path of a Hub file, from the cache first, downloading it only on a miss."""
+        path = self.lookup(repo_id, filename)
+        if path is not None:
+            return path
+
+        if self.offline:
+            raise FileNotFoundError(f"{repo_id}/{filename} is not in the model cache '{self.root}' and MODEL_OFFLINE is set")
+
+        return self.add(repo_id, filename, hf_hub_download(repo_id=repo_id, filename=filename))
+
+    def resolve_mmap(self, repo_id, filename):
+        """Like resolve, for a state dict converted once (per content) for torch.load(mmap=True)."""
+        source = self.resolve(repo_id, filename)
+        path = self.mmap_path(os.path.basename(source))
+
+        if not os.path.exists(path):
+            # Workers starting together must map the same file (inode) to share its pages
+            with file_lock(path + '.lock'):
+                if not os.path.exists(path):
+                    convert_state_dict(source, path)
+
+        return path
+
+    def verify(self):
+        """Blob digests that no longer match their contents."""
+        blobs_dir = os.path.join(self.root, 'blobs')
+        if not os.path.isdir(blobs_dir):
+            return []
+
+        return [digest for digest in os.listdir(blobs_dir)
+                if not digest.startswith('tmp') and file_sha256(self.blob_path(digest)) != digest]
+
+model_store = ModelStore()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local model cache (e.g. seed it at image build time).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch = subparsers.add_parser("fetch", help="resolve a Hub file into the cache")
+    fetch.add_argument("repo_id")
+    fetch.add_argument("filename")
+
+    add = subparsers.add_parser("add", help="add a local file to the cache under a Hub name")
+    add.add_argument("repo_id")
+    add.add_argument("filename")
+    add.add_argument("path")
+
+    subparsers.add_parser("verify", help="re-hash every cached blob")
+    args = parser.parse_args()
+
+    if args.command == "fetch":
+        print(model_store.resolve(args.repo_id, args.filename))
+    elif args.command == "add":
+        print(model_store.add(args.repo_id, args.filename, args.path))
+    else:
+        corrupt = model_store.verify()
+        for digest in corrupt:
+            print(f"corrupt: {digest}")
+        print("ok" if not corrupt else f"{len(corrupt)} corrupt blob(s)")
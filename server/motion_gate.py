@@ -0,0 +1,87 @@
+import os
+import time
+
+import torch
+
+INFERENCE_INTERVAL = float(os.getenv("INFERENCE_INTERVAL", 0.2))  # seconds, normal signing
+ACTIVE_INFERENCE_INTERVAL = float(os.getenv("ACTIVE_INFERENCE_INTERVAL", 0.1))  # fast motion
+IDLE_INFERENCE_INTERVAL = float(os.getenv("IDLE_INFERENCE_INTERVAL", 1.0))  # signer still
+
+# Mean per-node hand displacement between frames, in shoulder widths (landmarks are normalized)
+MOTION_IDLE_THRESHOLD = float(os.getenv("MOTION_IDLE_THRESHOLD", 0.01))
+MOTION_ACTIVE_THRESHOLD = float(os.getenv("MOTION_ACTIVE_THRESHOLD", 0.05))
+MOTION_SMOOTHING = 0.5
+
+# Keep inferring this long after the last real hand detection, then stop until hands return
+NO_HANDS_GRACE = float(os.getenv("NO_HANDS_GRACE", 0.5))
+
+HAND_NODES = slice(0, 42)
+
+# Totals over all sessions
+gate_totals = {'frames': 0, 'inferences': 0, 'baseline_inferences': 0, 'skipped': 0}
+
+# Motion-Gated Inference Scheduling
+class MotionGate:
+    """
+    Tracks hand motion energy and hand-detection presence of one session and decides
+    when the classifier should run: faster during active signing, slower when still,
+    not at all once no real hand has been detected for NO_HANDS_GRACE seconds.
+    """
+    def __init__(self, now=None):
+        self.prev_frame = None
+        self.motion = 0.0
+        self.last_hands_time = 0.0
+        self.last_inference_time = time.time() if now is None else now
+        self.baseline_time = self.last_inference_time
+
+        self.stats = {'frames': 0, 'inferences': 0, 'baseline_inferences': 0, 'skipped': 0}
+
+    def update(self, corrected_frame, hands_detected, now=None):
+        """corrected_frame: (67, 3) output of correct_landmarks, hands_detected: any hand in the raw landmarks."""
+        now = time.time() if now is None else now
+
+        hands = corrected_frame[HAND_NODES]
+        if self.prev_frame is not None:
+            displacement = torch.linalg.vector_norm(hands - self.prev_frame, dim=-1).mean().item()
+            self.motion = MOTION_SMOOTHING * self.motion + (1 - MOTION_SMOOTHING) * displacement
+
+        self.prev_frame = hands.clone()
+
+        if hands_detected:
+            self.last_hands_time = now
+
+    def interval(self, now):
+        if now - self.last_hands_time > NO_HANDS_GRACE:
+            return None
+
+        if self.motion < MOTION_IDLE_THRESHOLD:
+            return IDLE_INFERENCE_INTERVAL
+        if self.motion > MOTION_ACTIVE_THRESHOLD:
+            return ACTIVE_INFERENCE_INTERVAL
+        return INFERENCE_INTERVAL
+
+    def should_infer(self, now=None):
+        now = time.time() if now is None else now
+        interval = self.interval(now)
+        run = interval is not None and now - self.last_inference_time >= interval
+
+        # Compare against the fixed INFERENCE_INTERVAL schedule to count skipped inferences
+        baseline_due = now - self.baseline_time >= INFERENCE_INTERVAL
+        if baseline_due:
+            self.baseline_time = now
+
+        self.count('frames')
+        if baseline_due:
+            self.count('baseline_inferences')
+            if not run:
+                self.count('skipped')
+
+        if run:
+            self.last_inference_time = now
+            self.count('inferences')
+
+        return run
+
+    def count(self, key):
+        self.stats[key] += 1
+        gate_totals[key] += 1
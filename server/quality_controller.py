@@ -0,0 +1,108 @@
+import os
+import time
+
+# (Holistic model_complexity, input resolution), best first
+QUALITY_TIERS = (
+    (2, (640, 480)),
+    (1, (640, 480)),
+    (1, (480, 360)),
+    (0, (320, 240)),
+)
+
+# Lowest tier sessions may be moved to, 0 keeps every session at full quality
+QUALITY_MAX_TIER = min(int(os.getenv("QUALITY_MAX_TIER", len(QUALITY_TIERS) - 1)), len(QUALITY_TIERS) - 1)
+
+# Landmark worker round trip (queueing included, so it rises with server load) a session should stay under
+QUALITY_LATENCY_BUDGET = float(os.getenv("QUALITY_LATENCY_BUDGET_MS", 120)) / 1000  # seconds
+
+# Hysteresis: step down above the budget, back up only well below it, and hold a tier for a while
+QUALITY_DOWNGRADE_RATIO = 1.0
+QUALITY_UPGRADE_RATIO = 0.5
+QUALITY_DOWNGRADE_HOLD = float(os.getenv("QUALITY_DOWNGRADE_HOLD", 2.0))  # seconds
+QUALITY_UPGRADE_HOLD = float(os.getenv("QUALITY_UPGRADE_HOLD", 10.0))  # seconds
+QUALITY_MAX_UPGRADE_HOLD = 120.0
+LATENCY_SMOOTHING = 0.8
+
+# Totals over all sessions
+quality_totals = {'downgrades': 0, 'upgrades': 0, 'failed_upgrades': 0}
+
+# Load-Adaptive Landmark Quality
+class QualityController:
+    """
+    Picks the landmark extraction tier of one session from its smoothed worker latency.
+    Steps down one tier when the latency budget is exceeded, and back up once latency has
+    stayed well below it for the upgrade hold. An upgrade that has to be undone right away
+    doubles the upgrade hold, so a session doesn't oscillate between two tiers.
+    """
+    def __init__(self, latency_budget=QUALITY_LATENCY_BUDGET, max_tier=QUALITY_MAX_TIER):
+        self.latency_budget = latency_budget
+        self.max_tier = max_tier
+        self.tier = 0
+        self.latency = None
+        self.last_change = time.perf_counter()
+        self.upgrade_hold = QUALITY_UPGRADE_HOLD
+        self.last_upgrade = None
+        self.changed = False
+
+        self.stats = {'downgrades': 0, 'upgrades': 0, 'failed_upgrades': 0}
+
+    @property
+    def model_complexity(self):
+        return QUALITY_TIERS[self.tier][0]
+
+    @property
+    def resolution(self):
+        return QUALITY_TIERS[self.tier][1]
+
+    def update(self, latency, now=None):
+        """Feeds one frame's landmark latency (seconds), returns the tier for the next frame."""
+        now = time.perf_counter() if now is None else now
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = LATENCY_SMOOTHING * self.latency + (1 - LATENCY_SMOOTHING) * latency
+
+        held = now - self.last_change
+
+        if self.latency > self.latency_budget * QUALITY_DOWNGRADE_RATIO and self.tier < self.max_tier:
+            if held >= QUALITY_DOWNGRADE_HOLD:
+                if self.last_upgrade is not None and now - self.last_upgrade < self.upgrade_hold:
+                    # Capacity wasn't really back, wait longer before the next attempt
+                    self.upgrade_hold = min(2 * self.upgrade_hold, QUALITY_MAX_UPGRADE_HOLD)
+                    self.count('failed_upgrades')
+
+                self.set_tier(self.tier + 1, now)
+                self.count('downgrades')
+
+        elif self.latency < self.latency_budget * QUALITY_UPGRADE_RATIO and self.tier > 0:
+            if held >= self.upgrade_hold:
+                self.set_tier(self.tier - 1, now)
+                self.last_upgrade = now
+                self.count('upgrades')
+
+        elif self.last_upgrade is not None and now - self.last_upgrade >= self.upgrade_hold:
+            # The last upgrade held up, recover the normal upgrade hold
+            self.upgrade_hold = QUALITY_UPGRADE_HOLD
+            self.last_upgrade = None
+
+        return self.tier
+
+    def set_tier(self, tier, now):
+        self.tier = tier
+        self.last_change = now
+        # Smoothed latency was measured at the old tier
+        self.latency = None
+        self.changed = True
+
+    def tier_hint(self):
+        """The new tier description once after every change, else None."""
+        if not self.changed:
+            return None
+
+        self.changed = False
+        return {'tier': self.tier, 'model_complexity': self.model_complexity, 'resolution': list(self.resolution)}
+
+    def count(self, key):
+        self.stats[key] += 1
+        quality_totals[key] += 1
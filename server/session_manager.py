@@ -0,0 +1,304 @@
+import asyncio
+import os
+import sys
+import time
+
+
+def available_cpus():
+    """Cores this process may run on: its CPU affinity, capped by a cgroup CPU quota (containers)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2, then v1
+    quota_files = (('/sys/fs/cgroup/cpu.max', None),
+                   ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', '/sys/fs/cgroup/cpu/cpu.cfs_period_us'))
+    for quota_file, period_file in quota_files:
+        try:
+            with open(quota_file) as f:
+                values = f.read().split()
+            if period_file is not None:
+                with open(period_file) as f:
+                    values.append(f.read().strip())
+        except OSError:
+            continue
+
+        quota, period = values[:2]
+        if quota not in ('max', '-1'):
+            cpus = min(cpus, int(quota) / int(period))
+        break
+
+    return cpus
+
+SESSION_CPU_CAPACITY = float(os.getenv("SESSION_CPU_CAPACITY", 0.8 * available_cpus()))  # cores sessions may use
+SESSION_CPU_COST = float(os.getenv("SESSION_CPU_COST", 0.5))  # cores a frame session is assumed to use until measured
+SESSION_LANDMARKS_CPU_COST = float(os.getenv("SESSION_LANDMARKS_CPU_COST", 0.05))  # same for landmarks sessions (no decode or MediaPipe)
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 0))  # hard cap on sessions, 0 = CPU budget only
+SESSION_ADMISSION_TIMEOUT = float(os.getenv("SESSION_ADMISSION_TIMEOUT", 0))  # seconds to queue for capacity, 0 = reject
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", 60))  # seconds without a processed frame, 0 = never evict
+
+SWEEP_INTERVAL = 1.0  # seconds between cost measurements and idle checks
+COST_WINDOW = 5.0  # seconds of processing per cost measurement
+COST_SMOOTHING = 0.5  # weight of a session's previous cost
+PROTOCOL_COST_SMOOTHING = 0.9  # weight of a protocol's previous estimate
+
+
+class Session:
+    """
+    State of one websocket session. prev_lm is a (67, 3) float32 frame of the last seen
+    landmarks, updated in place. cpu_seconds adds up the session's own CPU time (frame decode
+    and landmark extraction in its worker process, correction and frame embedding on the
+    event loop thread). The batched word model pass is shared and isn't attributed to sessions.
+    """
+    __slots__ = (
+        'session_id', 'protocol',
+        'frame_buffer', 'gloss_buffer', 'text_buffer', 'counter', 'prev_lm',
+        'motion_gate', 'frame_intake', 'quality', 'recorder',
+        'start_time', 'last_frame_time', 'last_active_time',
+        'frames', 'cpu_seconds', 'cost', 'measured_time', 'measured_frames', 'measured_cpu_seconds',
+        'evict_reason', 'evicted',
+    )
+
+    def __init__(self, session_id, protocol, now):
+        self.session_id = session_id
+        self.protocol = protocol
+
+        self.frame_buffer = None
+        self.gloss_buffer = None
+        self.text_buffer = None
+        self.counter = None
+        self.prev_lm = None
+        self.motion_gate = None
+        self.frame_intake = None
+        self.quality = None
+        self.recorder = None
+
+        self.start_time = now
+        self.last_frame_time = now  # last frame received
+        self.last_active_time = now  # last frame processed
+
+        self.frames = 0
+        self.cpu_seconds = 0.0
+        self.cost = None  # measured cores, None until COST_WINDOW of processing
+        self.measured_time = now
+        self.measured_frames = 0
+        self.measured_cpu_seconds = 0.0
+
+        self.evict_reason = None
+        self.evicted = asyncio.Event()
+
+    def state_bytes(self):
+        """Bytes held by the session's largest buffers: frames, embeddings, last landmarks and pending frame."""
+        size = sys.getsizeof(self)
+
+        if self.prev_lm is not None:
+            size += self.prev_lm.nbytes
+        if self.frame_buffer is not None:
+            size += self.frame_buffer.storage.nbytes
+            embeddings = getattr(self.frame_buffer, 'embeddings', None)
+            if embeddings is not None:
+                size += embeddings.nbytes
+        if self.frame_intake is not None and self.frame_intake.latest is not None:
+            size += len(self.frame_intake.latest[0])
+
+        return size
+
+
+class PendingAdmission:
+    __slots__ = ('session_id', 'protocol', 'enqueue_time', 'future')
+
+    def __init__(self, session_id, protocol, enqueue_time, future):
+        self.session_id = session_id
+        self.protocol = protocol
+        self.enqueue_time = enqueue_time
+        self.future = future
+
+
+# Session Admission and Eviction
+class SessionManager:
+    """
+    Owns the sessions of this server. A new session is admitted while the measured CPU use of
+    the current ones plus the expected cost of one more (the running average for its protocol)
+    fits in `cpu_capacity` cores; otherwise it waits in a FIFO queue for up to
+    `admission_timeout` seconds, or is rejected right away. Sessions that haven't processed a
+    frame for `idle_timeout` seconds are flagged for eviction, the endpoint closes them.
+    """
+    def __init__(self, cpu_capacity=SESSION_CPU_CAPACITY, default_cost=SESSION_CPU_COST, landmarks_cost=SESSION_LANDMARKS_CPU_COST,
+                 max_sessions=MAX_SESSIONS, admission_timeout=SESSION_ADMISSION_TIMEOUT, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.cpu_capacity = cpu_capacity
+        self.default_cost = default_cost
+        # Landmarks sessions only correct and embed frames, a fraction of what a frame session costs
+        self.initial_costs = {'landmarks': landmarks_cost}
+        self.max_sessions = max_sessions
+        self.admission_timeout = admission_timeout
+        self.idle_timeout = idle_timeout
+
+        self.sessions = {}
+        self.waiting = []
+        self.protocol_costs = {}
+        self.worker = None
+
+        self.stats = {
+            'admitted': 0,
+            'queued': 0,
+            'admitted_from_queue': 0,
+            'rejected': 0,
+            'evicted_idle': 0,
+            'evicted_stalled': 0,
+            'queue_wait_sum': 0.0,
+        }
+
+    def start(self):
+        # Sweeper is bound to the running event loop, so it is created on first use
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    # ----- Admission -----
+    def estimate(self, protocol):
+        """Expected cores of a new session of this protocol."""
+        if protocol in self.protocol_costs:
+            return self.protocol_costs[protocol]
+        return self.initial_costs.get(protocol, self.default_cost)
+
+    def session_cost(self, session):
+        return session.cost if session.cost is not None else self.estimate(session.protocol)
+
+    def cpu_load(self):
+        return sum(self.session_cost(session) for session in self.sessions.values())
+
+    def has_capacity(self, protocol):
+        if self.max_sessions and len(self.sessions) >= self.max_sessions:
+            return False
+
+        # A lone session is always admitted, whatever its estimate
+        return len(self.sessions) == 0 or self.cpu_load() + self.estimate(protocol) <= self.cpu_capacity
+
+    def try_admit(self, session_id, protocol):
+        """The new, registered Session if there is capacity now (and nobody queued before it), else None."""
+        self.start()
+
+        if self.waiting or not self.has_capacity(protocol):
+            return None
+
+        return self._register(session_id, protocol)
+
+    async def wait_admit(self, session_id, protocol):
+        """Queues for capacity up to admission_timeout seconds. The Session, or None if rejected."""
+        if self.admission_timeout <= 0:
+            self.stats['rejected'] += 1
+            return None
+
+        self.start()
+
+        waiter = PendingAdmission(session_id, protocol, time.perf_counter(), asyncio.get_running_loop().create_future())
+        self.waiting.append(waiter)
+        self.stats['queued'] += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.admission_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Admitted in the meantime, but nobody will use the session
+            if waiter.future.done():
+                self.release(waiter.future.result())
+            raise
+        finally:
+            if not waiter.future.done():
+                self.waiting.remove(waiter)
+                waiter.future.cancel()
+
+        if waiter.future.cancelled():
+            self.stats['rejected'] += 1
+            return None
+
+        return waiter.future.result()
+
+    def admit_waiting(self):
+        # First come, first served: a large session at the head isn't overtaken by smaller ones
+        while self.waiting and self.has_capacity(self.waiting[0].protocol):
+            waiter = self.waiting.pop(0)
+            self.stats['admitted_from_queue'] += 1
+            self.stats['queue_wait_sum'] += time.perf_counter() - waiter.enqueue_time
+            waiter.future.set_result(self._register(waiter.session_id, waiter.protocol))
+
+    def _register(self, session_id, protocol):
+        session = Session(session_id, protocol, time.perf_counter())
+        self.sessions[session_id] = session
+        self.stats['admitted'] += 1
+        return session
+
+    def release(self, session):
+        if self.sessions.pop(session.session_id, None) is not None:
+            self.admit_waiting()
+
+    # ----- Activity -----
+    def frame_received(self, session):
+        session.last_frame_time = time.perf_counter()
+
+    def frame_processed(self, session):
+        session.last_active_time = time.perf_counter()
+        session.frames += 1
+
+    # ----- Sweep -----
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.sweep(time.perf_counter())
+
+    def sweep(self, now):
+        for session in list(self.sessions.values()):
+            self.measure(session, now)
+
+            if self.idle_timeout > 0 and session.evict_reason is None and now - session.last_active_time > self.idle_timeout:
+                # Frames still arriving but none processed: the session is stuck, e.g. on a client that stopped reading
+                stalled = now - session.last_frame_time <= self.idle_timeout
+                self.evict(session, 'stalled' if stalled else 'idle')
+
+        # Costs changed, queued sessions may fit now
+        self.admit_waiting()
+
+    def measure(self, session, now):
+        elapsed = now - session.measured_time
+        if elapsed < COST_WINDOW:
+            return
+
+        frames = session.frames - session.measured_frames
+        cost = (session.cpu_seconds - session.measured_cpu_seconds) / elapsed
+
+        session.measured_time = now
+        session.measured_frames = session.frames
+        session.measured_cpu_seconds = session.cpu_seconds
+
+        session.cost = cost if session.cost is None else COST_SMOOTHING * session.cost + (1 - COST_SMOOTHING) * cost
+
+        # Only sessions that are sending frames say what a new session will cost
+        if frames > 0:
+            previous = self.protocol_costs.get(session.protocol)
+            self.protocol_costs[session.protocol] = cost if previous is None else (
+                PROTOCOL_COST_SMOOTHING * previous + (1 - PROTOCOL_COST_SMOOTHING) * cost
+            )
+
+    def evict(self, session, reason):
+        session.evict_reason = reason
+        session.evicted.set()
+        self.stats['evicted_' + reason] += 1
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        state_bytes = sum(session.state_bytes() for session in self.sessions.values())
+
+        stats['sessions'] = len(self.sessions)
+        stats['waiting'] = len(self.waiting)
+        stats['cpu_load'] = self.cpu_load()
+        stats['cpu_capacity'] = self.cpu_capacity
+        stats['state_bytes'] = state_bytes
+        stats['state_bytes_per_session'] = state_bytes / max(len(self.sessions), 1)
+        stats['avg_queue_wait'] = stats['queue_wait_sum'] / max(stats['admitted_from_queue'], 1)
+        return stats
@@ -0,0 +1,209 @@
+# Record and replay of session landmark streams.
+# A recording is a small header followed by one fixed-size record per frame, laid out exactly
+# like a client landmark packet (LANDMARK_HEADER + float32 nodes), with the server receive time
+# as timestamp. Recordings are append-only and are memory-mapped for replay.
+# Run from server/:
+#   python session_recorder.py info recordings/<session>.slr
+#   python session_recorder.py replay recordings/<session>.slr [--realtime]
+import argparse
+import json
+import os
+import random
+import struct
+import time
+
+import numpy as np
+
+from frame_handler import LANDMARK_HEADER, LANDMARK_PACKET_SIZE, decode_landmark_packet
+from landmark_postprocess import PARTS, NUM_NODES, landmarks_dict_to_frame
+
+SESSION_RECORD_DIR = os.getenv("SESSION_RECORD_DIR")  # recording is off unless set
+SESSION_RECORD_FRACTION = float(os.getenv("SESSION_RECORD_FRACTION", 1.0))  # share of sessions recorded
+
+RECORDING_SUFFIX = '.slr'
+RECORDING_MAGIC = b'SLTREC\x00\x01'
+RECORDING_HEADER = struct.Struct('<8sHHd')  # magic, record size, nodes, start time (unix seconds)
+RECORDING_BUFFER_SIZE = 1 << 16  # about 80 frames per write
+
+# One record, same bytes as a landmark packet
+RECORD_DTYPE = np.dtype([
+    ('seq', '<u4'),
+    ('timestamp', '<f8'),
+    ('presence', 'u1'),
+    ('padding', 'V3'),
+    ('landmarks', '<f4', (NUM_NODES, 3)),
+])
+assert RECORD_DTYPE.itemsize == LANDMARK_PACKET_SIZE and LANDMARK_HEADER.size == RECORD_DTYPE.fields['landmarks'][1]
+
+EMPTY_FRAME = np.zeros((NUM_NODES, 3), dtype=np.float32)
+
+
+# ----- Recording -----
+class SessionRecorder:
+    """
+    Appends a session's raw landmark dicts (before correct_landmarks) to a recording.
+    Each frame is copied into one preallocated record and handed to a buffered file,
+    so the hot path costs a few microseconds and a disk write every ~80 frames.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, 'wb', buffering=RECORDING_BUFFER_SIZE)
+        self.file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORD_DTYPE.itemsize, NUM_NODES, time.time()))
+
+        self.record = np.zeros(1, dtype=RECORD_DTYPE)
+        self.frame = self.record['landmarks'][0]
+
+    def record_frame(self, landmarks, timestamp=None):
+        _, presence = landmarks_dict_to_frame(landmarks, EMPTY_FRAME, out=self.frame)
+
+        self.record['seq'] = self.seq
+        self.record['timestamp'] = time.time() if timestamp is None else timestamp
+        self.record['presence'] = sum(1 << i for i, present in enumerate(presence) if present)
+
+        self.file.write(self.record.data)
+        self.seq += 1
+
+    def close(self):
+        self.file.close()
+
+def open_session_recorder(session_id, record_dir=SESSION_RECORD_DIR, fraction=SESSION_RECORD_FRACTION):
+    """A SessionRecorder for this session if recording is enabled and it is sampled, else None."""
+    if not record_dir or random.random() >= fraction:
+        return None
+
+    return SessionRecorder(os.path.join(record_dir, session_id + RECORDING_SUFFIX))
+
+
+# ----- Loading -----
+def load_recording(path):
+    """
+    (start_time, records): the records as a read-only memory-mapped RECORD_DTYPE array.
+    A partly written last record (recording cut short) is left out.
+    """
+    with open(path, 'rb') as f:
+        magic, record_size, num_nodes, start_time = RECORDING_HEADER.unpack(f.read(RECORDING_HEADER.size))
+
+    if magic != RECORDING_MAGIC or record_size != RECORD_DTYPE.itemsize or num_nodes != NUM_NODES:
+        raise ValueError(f"{path} is not a landmark recording of this format")
+
+    count = (os.path.getsize(path) - RECORDING_HEADER.size) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return start_time, np.empty(0, dtype=RECORD_DTYPE)
+
+    return start_time, np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=RECORDING_HEADER.size, shape=(count,))
+
+def record_landmarks(record):
+    """The landmark dict a record was made from, as frame_landmarks returned it."""
+    # A record is a landmark packet byte for byte
+    return decode_landmark_packet(record.tobytes())
+
+def recording_stream(path):
+    """(frames (T, 67, 3), presence (T, 3)) of a recording, for benchmarks. Missing parts are zeros."""
+    _, records = load_recording(path)
+    presence = (records['presence'][:, None] >> np.arange(len(PARTS))) & 1
+    return np.array(records['landmarks']), presence.astype(bool)
+
+
+# ----- Replay -----
+def replay_session(records, model, realtime=False, threshold=0.75, start_time=None):
+    """
+    Pushes recorded frames through the server's per-frame path: correct_landmarks ->
+    EmbeddingFrameBuffer -> motion gate -> word model -> GlossBuffer. The motion gate runs on
+    the recorded clock from start_time (the recording's, by default its first frame), so it
+    makes the same decisions as in the session at any replay speed. The GlossBuffer
+    works on wall-clock time and only matches the original session with realtime=True.
+    Returns (predictions, glosses, per-frame processing seconds).
+    """
+    from landmark_extracter import correct_landmarks, default_landmarks
+    from motion_gate import MotionGate
+    from text_language_generator import GlossBuffer
+    from word_level_model import EmbeddingFrameBuffer, predict_word_gloss_batch
+
+    frame_buffer = EmbeddingFrameBuffer(model, max_size=25)
+    gloss_buffer = GlossBuffer()
+
+    if start_time is None and len(records):
+        start_time = float(records[0]['timestamp'])
+
+    motion_gate = MotionGate(now=start_time)
+    prev_lm, _ = landmarks_dict_to_frame(default_landmarks, None)
+
+    predictions = []
+    durations = np.empty(len(records))
+    replay_start = time.perf_counter()
+
+    for i, record in enumerate(records):
+        timestamp = float(record['timestamp'])
+
+        if realtime:
+            delay = (timestamp - float(records[0]['timestamp'])) - (time.perf_counter() - replay_start)
+            if delay > 0:
+                time.sleep(delay)
+
+        start = time.perf_counter()
+        curr_lm = record_landmarks(record)
+
+        corrected_lm = correct_landmarks(curr_lm, prev_lm)
+        landmarks_dict_to_frame(curr_lm, prev_lm, out=prev_lm)
+
+        frame_buffer.add_frame(corrected_lm)
+        motion_gate.update(corrected_lm, 'left_hand' in curr_lm or 'right_hand' in curr_lm, now=timestamp)
+
+        frame_seq = frame_buffer.get_embeddings()
+        if len(frame_seq) > 0 and motion_gate.should_infer(now=timestamp):
+            word_gloss, word_conf = predict_word_gloss_batch(model, [frame_seq], embedded=True)[0]
+
+            if word_conf >= threshold:
+                gloss_buffer.append_gloss(word_gloss)
+
+            predictions.append({'seq': int(record['seq']), 'timestamp': timestamp,
+                                'gloss': word_gloss, 'confidence': word_conf, 'accepted': word_conf >= threshold})
+
+        durations[i] = time.perf_counter() - start
+
+    return predictions, gloss_buffer.get_buffer(), durations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or replay a session landmark recording.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    info = subparsers.add_parser("info", help="summarise a recording")
+    info.add_argument("path")
+
+    replay = subparsers.add_parser("replay", help="run a recording through the server's gloss prediction path")
+    replay.add_argument("path")
+    replay.add_argument("--realtime", action="store_true", help="replay at the original speed instead of as fast as possible")
+    replay.add_argument("--threshold", type=float, default=0.75, help="word confidence needed to accept a gloss")
+    args = parser.parse_args()
+
+    start_time, records = load_recording(args.path)
+
+    if args.command == "info":
+        timestamps = records['timestamp']
+        duration = float(timestamps[-1] - timestamps[0]) if len(records) > 1 else 0.0
+        presence = (records['presence'][:, None] >> np.arange(len(PARTS))) & 1
+
+        print(json.dumps({
+            'start_time': start_time,
+            'frames': len(records),
+            'duration_s': round(duration, 3),
+            'fps': round((len(records) - 1) / duration, 2) if duration > 0 else None,
+            'presence_rate': {part_type: round(float(presence[:, i].mean()), 3) if len(records) else 0.0
+                              for i, part_type in enumerate(PARTS)},
+        }, indent=2))
+    else:
+        from word_level_model import load_word_model, WORD_MODEL_FILE
+
+        model = load_word_model(WORD_MODEL_FILE)
+        predictions, glosses, durations = replay_session(records, model, args.realtime, args.threshold, start_time)
+
+        for prediction in predictions:
+            print(json.dumps(prediction))
+
+        p50, p99 = np.percentile(durations, [50, 99]) * 1000 if len(durations) else (0.0, 0.0)
+        print(json.dumps({'frames': len(records), 'inferences': len(predictions), 'glosses': glosses,
+                          'frame_p50_ms': round(float(p50), 3), 'frame_p99_ms': round(float(p99), 3)}))
@@ -0,0 +1,60 @@
+import time
+from contextlib import contextmanager
+
+import torch
+
+from frame_handler import MIN_SEQUENCE_LENGTH
+from word_level_model import encode_frames, predict_word_gloss_batch, num_nodes, in_channels
+
+WARMUP_WINDOW_SIZE = 25  # same as the websocket frame buffer
+
+
+# Readiness State
+class StartupTracker:
+    """Readiness of the server's background start-up and how long each stage took."""
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.ready = False
+        self.error = None
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def mark_ready(self):
+        self.timings['total'] = time.perf_counter() - self.start_time
+        self.ready = True
+
+    def fail(self, error):
+        self.timings['total'] = time.perf_counter() - self.start_time
+        self.error = str(error)
+
+    def get_status(self):
+        if self.ready:
+            status = 'ready'
+        elif self.error is not None:
+            status = 'failed'
+        else:
+            status = 'starting'
+
+        return {'status': status, 'error': self.error, 'timings': dict(self.timings)}
+
+
+# ----- Warm-up -----
+def warm_up_word_model(model, max_length=WARMUP_WINDOW_SIZE):
+    """
+    Runs a dummy window of every length a session's buffer goes through on the streaming
+    path, plus one full raw window, so lazy work (per-length traced classifiers, allocator
+    and thread pool start-up) happens before the server takes traffic.
+    """
+    frames = torch.zeros((max_length, num_nodes, in_channels))
+    embeddings = encode_frames(model, frames)
+
+    predict_word_gloss_batch(model, [frames])
+    for length in range(MIN_SEQUENCE_LENGTH, max_length + 1):
+        predict_word_gloss_batch(model, [embeddings[:length]], embedded=True)
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+
+TEXT_BACKEND = os.getenv("TEXT_BACKEND", "gemini")
+GENERATION_TIMEOUT = float(os.getenv("TEXT_GENERATION_TIMEOUT", 10))  # seconds
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("TEXT_MAX_CONCURRENT", 8))
+ECHO_TOKEN_DELAY = float(os.getenv("TEXT_ECHO_TOKEN_DELAY", 0))  # seconds between streamed echo words
+
+# ----- Backend Interface -----
+class TextBackend:
+    """
+    Async text generation backend. Subclasses implement `_generate` and optionally
+    `_stream`, this class bounds concurrent calls and applies the per-call timeout.
+    """
+    def __init__(self, max_concurrent=MAX_CONCURRENT_GENERATIONS, timeout=GENERATION_TIMEOUT):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.timeout = timeout
+
+    async def generate(self, prompt, max_new_tokens=50, timeout=None):
+        """
+        Raises asyncio.TimeoutError after `timeout` seconds. Cancelling the caller
+        (e.g. on client disconnect) cancels the in-flight request.
+        """
+        async with self.semaphore:
+            return await asyncio.wait_for(
+                self._generate(prompt, max_new_tokens),
+                timeout if timeout is not None else self.timeout
+            )
+
+    async def stream(self, prompt, max_new_tokens=50, timeout=None):
+        """
+        Async iterator of text chunks as the backend produces them. The timeout covers the
+        whole stream. Closing the iterator early (or cancelling the caller) ends the request.
+        """
+        loop = asyncio.get_running_loop()
+
+        async with self.semaphore:
+            deadline = loop.time() + (timeout if timeout is not None else self.timeout)
+            chunks = self._stream(prompt, max_new_tokens)
+
+            try:
+                while True:
+                    # Read in the caller's task: wait_for would run each step in a new task, which
+                    # the Gemini (httpx/anyio) stream doesn't allow. The timeout only spans the read,
+                    # a timeout across the yield would cancel the consumer's own code instead.
+                    async with asyncio.timeout_at(deadline):
+                        try:
+                            chunk = await chunks.__anext__()
+                        except StopAsyncIteration:
+                            break
+
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+    async def _generate(self, prompt, max_new_tokens):
+        raise NotImplementedError
+
+    async def _stream(self, prompt, max_new_tokens):
+        # Backends without streaming answer in one chunk
+        yield await self._generate(prompt, max_new_tokens)
+
+
+# ----- Gemini Backend -----
+class GeminiBackend(TextBackend):
+    def __init__(self, model="gemini-2.5-flash", **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+        self.client = None
+
+    def get_client(self):
+        if self.client is None:
+            from google import genai
+            self.client = genai.Client()
+        return self.client
+
+    async def _generate(self, prompt, max_new_tokens):
+        response = await self.get_client().aio.models.generate_content(
+            model=self.model,
+            contents=prompt
+        )
+        return response.text or ""
+
+    async def _stream(self, prompt, max_new_tokens):
+        stream = await self.get_client().aio.models.generate_content_stream(
+            model=self.model,
+            contents=prompt
+        )
+
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+
+# ----- Local Backend -----
+class EchoBackend(TextBackend):
+    """
+    Deterministic offline backend, answers with the gloss tokens of the prompt, or a JSON
+    array of them for a batched prompt with several gloss lines. Streams them one word per
+    chunk, token_delay seconds apart.
+    """
+    def __init__(self, token_delay=ECHO_TOKEN_DELAY, **kwargs):
+        super().__init__(**kwargs)
+        self.token_delay = token_delay
+
+    async def _generate(self, prompt, max_new_tokens):
+        gloss_lines = [line for line in prompt.split('\n') if line.startswith('Gloss:')]
+
+        if len(gloss_lines) == 0:
+            return ""
+        if len(gloss_lines) > 1:
+            return json.dumps([line[len('Gloss:'):].strip() for line in gloss_lines])
+
+        return gloss_lines[-1][len('Gloss:'):].strip()
+
+    async def _stream(self, prompt, max_new_tokens):
+        output = await self._generate(prompt, max_new_tokens)
+
+        for i, word in enumerate(output.split()):
+            await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else ' ' + word
+
+
+TEXT_BACKENDS = {
+    'gemini': GeminiBackend,
+    'echo': EchoBackend,
+}
+
+def create_text_backend(name=TEXT_BACKEND, **kwargs):
+    if name not in TEXT_BACKENDS:
+        raise ValueError(f"Unknown text backend '{name}', expected one of {list(TEXT_BACKENDS)}")
+
+    return TEXT_BACKENDS[name](**kwargs)
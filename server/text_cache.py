@@ -0,0 +1,115 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+TEXT_CACHE_SIZE = int(os.getenv("TEXT_CACHE_SIZE", 1024))
+TEXT_CACHE_TTL = float(os.getenv("TEXT_CACHE_TTL", 24 * 3600))  # seconds, 0 disables expiry
+TEXT_CACHE_PATH = os.getenv("TEXT_CACHE_PATH")  # sqlite file for the persistent tier
+
+# Gloss Sequence -> Sentence Cache
+class GenerationCache:
+    """
+    Bounded in-memory LRU with TTL, optionally backed by an sqlite file so entries
+    survive restarts. Keys are normalized gloss tuples, see `make_key`. The sqlite tier
+    runs on its own thread: lookups await it, writes are queued behind (write-behind).
+    """
+    def __init__(self, max_size=TEXT_CACHE_SIZE, ttl=TEXT_CACHE_TTL, path=TEXT_CACHE_PATH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (text, created_time)
+
+        self.db = None
+        self.executor = None
+        if path:
+            # One thread owns the connection, so disk reads and writes stay in order
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='text-cache')
+
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS generations (key TEXT PRIMARY KEY, text TEXT, created REAL)")
+            if self.ttl > 0:
+                # Expired rows would otherwise stay on disk for good
+                self.db.execute("DELETE FROM generations WHERE created < ?", (time.time() - self.ttl,))
+            self.db.commit()
+
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    @staticmethod
+    def make_key(gloss_list):
+        return tuple(gloss.strip().upper() for gloss in gloss_list if gloss.strip())
+
+    def is_expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    async def get(self, key):
+        now = time.time()
+        entry = self.entries.get(key)
+
+        if entry is not None:
+            if not self.is_expired(entry[1], now):
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[0]
+
+            del self.entries[key]
+            self.stats['expirations'] += 1
+
+        if self.db is not None:
+            row = await asyncio.get_running_loop().run_in_executor(self.executor, self.read_disk, key)
+
+            if row is not None and not self.is_expired(row[1], now):
+                # Promote to the memory tier
+                self.set_memory(key, row[0], row[1])
+                self.stats['disk_hits'] += 1
+                return row[0]
+
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key, text):
+        created = time.time()
+        self.set_memory(key, text, created)
+
+        if self.db is not None:
+            self.executor.submit(self.write_disk, key, text, created)
+
+    # ----- Disk tier, on the executor thread -----
+    def read_disk(self, key):
+        return self.db.execute("SELECT text, created FROM generations WHERE key = ?", (json.dumps(key),)).fetchone()
+
+    def write_disk(self, key, text, created):
+        try:
+            self.db.execute("INSERT OR REPLACE INTO generations VALUES (?, ?, ?)", (json.dumps(key), text, created))
+            self.db.commit()
+        except Exception as e:
+            print(f"Error writing text cache: {e}")
+
+    def clear_disk(self):
+        self.db.execute("DELETE FROM generations")
+        self.db.commit()
+
+    def set_memory(self, key, text, created):
+        self.entries[key] = (text, created)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self.entries.clear()
+
+        if self.db is not None:
+            self.executor.submit(self.clear_disk).result()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / max(lookups, 1)
+        stats['size'] = len(self.entries)
+        return stats
@@ -1,5 +1,6 @@
-from google import genai
 from collections import deque
+import asyncio
+import contextlib
 import time
 
 from dotenv import load_dotenv
@@ -7,35 +8,37 @@ import os
 
 load_dotenv()
 
-client = genai.Client()
+from metrics import text_generation_seconds, text_first_token_seconds
+from text_backends import create_text_backend
+from text_cache import GenerationCache
+from generation_dispatcher import GenerationDispatcher, TEXT_BATCHING
+
+text_backend = create_text_backend(os.getenv("TEXT_BACKEND", "gemini"))
+text_cache = GenerationCache()
+# Coalesces the default backend's requests across sessions
+text_dispatcher = GenerationDispatcher(text_backend)
 
 # generator = pipeline(task='text-generation', model="meta-llama/Llama-3.2-3B-Instruct")
 
-def generator(prompt, max_new_tokens=50):
+async def generator(prompt, max_new_tokens=50, backend=None):
+    backend = backend or text_backend
+
     try:
-      response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
-      )
-      return response.text
-    
+      return await backend.generate(prompt, max_new_tokens=max_new_tokens)
+
+    except asyncio.TimeoutError:
+      print("Error in text generation: timed out")
+      return ""
+
     except Exception as e:
       print(f"Error in text generation: {e}")
       return ""
 
-def generate_text(gloss_input, last_text=''):
+def build_prompt(gloss_input):
     instruct = 'You are a gloss-to-English converter. Output only the sentence using only given gloss tokens. No need to complete it with additional words. No explanations.'
-    prompt = f'{instruct}\nGloss: {gloss_input}\nSentence:'
-
-    max_tokens = len(gloss_input.split()) + len(prompt.split())
-
-    start = time.time()
-    output = generator(prompt, max_new_tokens=max_tokens)
-    # output = gloss_input
-    
-    end = time.time()
-    print(f"Time taken for generation: {end - start} seconds")
+    return f'{instruct}\nGloss: {gloss_input}\nSentence:'
 
+def clean_output(output, prompt):
     if prompt in output:
         output = output.replace(prompt, '').strip()
     if '(' in output:
@@ -44,7 +47,104 @@ def generate_text(gloss_input, last_text=''):
         output = output.strip()
 
     output = output.replace('_', ' ').strip()
-    return output.split('\n')[0]
+    output = output.split('\n')[0]
+
+    return output
+
+async def dispatch(gloss_input, backend):
+    """gloss_input's raw answer from a call batched with other sessions, None to call the backend alone."""
+    # Batches only go to the shared default backend
+    if not TEXT_BATCHING or (backend or text_backend) is not text_backend:
+        return None
+
+    try:
+        return await text_dispatcher.submit(gloss_input)
+    except Exception as e:
+        print(f"Error in text generation dispatch: {e}")
+        return None
+
+async def generate_text(gloss_input, last_text='', backend=None):
+    # Repeated phrases are served from cache
+    cache_key = text_cache.make_key(gloss_input.split())
+    cached_output = await text_cache.get(cache_key)
+
+    if cached_output is not None:
+        return cached_output
+
+    prompt = build_prompt(gloss_input)
+    max_tokens = len(gloss_input.split()) + len(prompt.split())
+
+    with text_generation_seconds.time():
+        output = await dispatch(gloss_input, backend)
+        if output is None:
+            output = await generator(prompt, max_new_tokens=max_tokens, backend=backend)
+    # output = gloss_input
+
+    output = clean_output(output, prompt)
+
+    if output:
+        text_cache.put(cache_key, output)
+
+    return output
+
+async def stream_text(gloss_input, last_text='', backend=None):
+    """
+    Streaming generate_text: yields (text, final) with the cleaned sentence so far after
+    every chunk that changes it, then once with final=True. Stops reading the backend as
+    soon as the cleaned sentence can't grow any more (a '(' or a second line started).
+    """
+    cache_key = text_cache.make_key(gloss_input.split())
+    cached_output = await text_cache.get(cache_key)
+
+    if cached_output is not None:
+        yield cached_output, True
+        return
+
+    backend = backend or text_backend
+    prompt = build_prompt(gloss_input)
+    max_tokens = len(gloss_input.split()) + len(prompt.split())
+
+    start = time.perf_counter()
+    raw, output = '', ''
+    complete = False
+
+    try:
+        # Not batched: a batch answers only once all of it is done, which defeats streaming
+        async with contextlib.aclosing(backend.stream(prompt, max_new_tokens=max_tokens)) as chunks:
+            async for chunk in chunks:
+                raw += chunk
+
+                rest = raw.replace(prompt, '').lstrip()
+                if prompt.startswith(rest):
+                    # Possibly the start of an echoed prompt, wait for more
+                    continue
+
+                text = clean_output(raw, prompt)
+                if text and text != output:
+                    if not output:
+                        text_first_token_seconds.observe(time.perf_counter() - start)
+                    output = text
+                    yield output, False
+
+                if output and ('(' in rest or '\n' in rest):
+                    break
+
+        complete = True
+        output = clean_output(raw, prompt)
+
+    except asyncio.TimeoutError:
+        print("Error in text generation: timed out")
+
+    except Exception as e:
+        print(f"Error in text generation: {e}")
+
+    text_generation_seconds.observe(time.perf_counter() - start)
+
+    # After an error the partial text the client has already seen is committed, but not cached
+    if complete and output:
+        text_cache.put(cache_key, output)
+
+    yield output, True
 
 WINDOW_SIZE = 8
 MIN_TRIGGER = 4
@@ -97,7 +197,7 @@ class GlossBuffer:
     return gloss_list
   
 
-def generate_continue_text(gloss_buffer, text_buffer, counter):
+async def generate_continue_text(gloss_buffer, text_buffer, counter, backend=None):
   gloss_list = gloss_buffer.get_gloss_list(counter)
 
   if len(gloss_list) > 0:
@@ -106,7 +206,7 @@ def generate_continue_text(gloss_buffer, text_buffer, counter):
     gloss_text = ' '.join(gloss_list)
     
     if len(gloss_list) >= MIN_TRIGGER:
-      gen_text = generate_text(gloss_text, ' '.join(text_list))
+      gen_text = await generate_text(gloss_text, ' '.join(text_list), backend=backend)
     else:
       gen_text = gloss_text
 
@@ -116,15 +216,42 @@ def generate_continue_text(gloss_buffer, text_buffer, counter):
     
   return ''
 
+async def stream_continue_text(gloss_buffer, text_buffer, counter, backend=None):
+  """
+  Streaming generate_continue_text: yields (text, final) as stream_text does, the final
+  text is committed to text_buffer. Yields ('', True) when there is nothing to generate.
+  """
+  gloss_list = gloss_buffer.get_gloss_list(counter)
+  gen_text = ''
+
+  if len(gloss_list) > 0:
+    gloss_text = ' '.join(gloss_list)
+
+    if len(gloss_list) >= MIN_TRIGGER:
+      async for gen_text, final in stream_text(gloss_text, ' '.join(text_buffer), backend=backend):
+        if not final:
+          yield gen_text, False
+    else:
+      gen_text = gloss_text
+
+    if gen_text and gen_text.strip() != '':
+      text_buffer.extend(gen_text.split())
+
+  yield gen_text, True
+
 def create_text_buffer(max_size=50):
     return deque(maxlen=max_size)
 
-if __name__ == "__main__":
+async def main():
     text = "HELLO HOW YOU/YOUR FEEL TODAY I/ME THINK FUTURE CAREER PLAN YOU/YOUR LIKE/LOVE BOOK_READ OR MOVIE/FILM"
     gloss_buffer = GlossBuffer()
 
     text_buffer = create_text_buffer()
+    counter = {'last_text_time': time.time()}
 
     for word in text.split():
       gloss_buffer.append_gloss(word)
-      generate_continue_text(gloss_buffer, text_buffer, {})
\ No newline at end of file
+      await generate_continue_text(gloss_buffer, text_buffer, counter)
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,155 @@
+import asyncio
+import math
+import os
+import tempfile
+
+import cv2
+import numpy as np
+import torch
+
+from frame_handler import MIN_SEQUENCE_LENGTH
+from landmark_extracter import default_landmarks
+from landmark_postprocess import correct_sequence, landmarks_dict_to_frame
+from text_language_generator import generate_text
+from word_level_model import encode_frames, predict_word_gloss_batch
+
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", 15))  # frames per second of video fed to the model
+VIDEO_CHUNK_FRAMES = int(os.getenv("VIDEO_CHUNK_FRAMES", 64))  # sampled frames per worker job
+VIDEO_CHUNK_OVERLAP = int(os.getenv("VIDEO_CHUNK_OVERLAP", 8))  # sampled frames tracked before each chunk
+VIDEO_WINDOW_STRIDE = int(os.getenv("VIDEO_WINDOW_STRIDE", 3))  # sampled frames between windows
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", 32))
+WINDOW_SIZE = 25  # same as the websocket frame buffer
+
+UPLOAD_READ_SIZE = 1 << 20
+
+
+# ----- Video Input -----
+async def save_upload(upload):
+    """Copies an UploadFile to a temporary file (OpenCV needs a path), returns the path."""
+    suffix = os.path.splitext(upload.filename or '')[1] or '.mp4'
+
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        while chunk := await upload.read(UPLOAD_READ_SIZE):
+            f.write(chunk)
+
+    return f.name
+
+def probe_video(path):
+    """(fps, frame_count), frame_count is 0 when the container doesn't report it."""
+    capture = cv2.VideoCapture(path)
+
+    if not capture.isOpened():
+        raise ValueError("Could not open video")
+
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+
+    if not fps or math.isnan(fps):
+        fps = 30.0
+
+    return fps, max(frame_count, 0)
+
+def plan_chunks(frame_count, step, chunk_frames=VIDEO_CHUNK_FRAMES):
+    """Raw-frame (start, stop) ranges of chunk_frames sampled frames, starts aligned to step."""
+    if frame_count == 0:
+        return [(0, None)]
+
+    chunk_size = chunk_frames * step
+    return [(start, min(start + chunk_size, frame_count)) for start in range(0, frame_count, chunk_size)]
+
+
+# ----- Windowed Inference -----
+def window_starts(num_frames, window_size=WINDOW_SIZE, stride=VIDEO_WINDOW_STRIDE):
+    if num_frames < MIN_SEQUENCE_LENGTH:
+        return []
+    if num_frames <= window_size:
+        return [0]
+
+    starts = list(range(0, num_frames - window_size + 1, stride))
+    if starts[-1] != num_frames - window_size:
+        # Cover the tail of the video too
+        starts.append(num_frames - window_size)
+
+    return starts
+
+def predict_windows(model, frames, window_size=WINDOW_SIZE, stride=VIDEO_WINDOW_STRIDE, batch_size=VIDEO_BATCH_SIZE):
+    """
+    Sliding-window glosses over corrected (T, 67, 3) frames. Every frame is encoded once,
+    windows share the embeddings and are classified in batches.
+    Returns a list of (start, stop, word_gloss, confidence) in frame indices.
+    """
+    starts = window_starts(len(frames), window_size, stride)
+    if len(starts) == 0:
+        return []
+
+    embeddings = encode_frames(model, frames)
+    predictions = []
+
+    for i in range(0, len(starts), batch_size):
+        batch_starts = starts[i:i + batch_size]
+        windows = [embeddings[start:start + window_size] for start in batch_starts]
+        results = predict_word_gloss_batch(model, windows, embedded=True)
+
+        for start, window, (word_gloss, word_conf) in zip(batch_starts, windows, results):
+            predictions.append((start, start + len(window), word_gloss, word_conf))
+
+    return predictions
+
+def build_timeline(predictions, timestamps, threshold):
+    """Merges consecutive confident windows with the same gloss into timed segments."""
+    timeline = []
+
+    for start, stop, word_gloss, word_conf in predictions:
+        if word_conf < threshold:
+            continue
+
+        start_time = float(timestamps[start])
+        end_time = float(timestamps[stop - 1])
+
+        if timeline and timeline[-1]['gloss'] == word_gloss and start_time <= timeline[-1]['end']:
+            segment = timeline[-1]
+            segment['end'] = max(segment['end'], end_time)
+            segment['confidence'] = max(segment['confidence'], word_conf)
+        else:
+            timeline.append({'gloss': word_gloss, 'start': start_time, 'end': end_time, 'confidence': word_conf})
+
+    return timeline
+
+
+# ----- Video Translation -----
+async def translate_video(path, model, landmark_pool, threshold, sample_fps=VIDEO_SAMPLE_FPS, with_text=False):
+    """
+    Translates a video file into a gloss timeline (and optionally a sentence). Landmarks
+    are extracted in parallel over overlapping chunks by the landmark worker pool.
+    """
+    fps, frame_count = probe_video(path)
+    step = max(1, round(fps / sample_fps)) if sample_fps > 0 else 1
+
+    chunks = await landmark_pool.extract_video(path, plan_chunks(frame_count, step), step, VIDEO_CHUNK_OVERLAP)
+
+    frames = np.concatenate([chunk[0] for chunk in chunks])
+    presence = np.concatenate([chunk[1] for chunk in chunks])
+    timestamps = np.concatenate([chunk[2] for chunk in chunks]) / fps
+
+    if len(frames) == 0:
+        raise ValueError("No frames could be decoded from the video")
+
+    prev, _ = landmarks_dict_to_frame(default_landmarks, None)
+    corrected = torch.from_numpy(correct_sequence(frames, presence, prev))
+
+    predictions = await asyncio.to_thread(predict_windows, model, corrected)
+    timeline = build_timeline(predictions, timestamps, threshold)
+
+    result = {
+        'duration': frame_count / fps if frame_count else float(timestamps[-1]),
+        'fps': fps,
+        'sampled_frames': len(frames),
+        'glosses': timeline,
+    }
+
+    if with_text:
+        gloss_input = ' '.join(segment['gloss'] for segment in timeline)
+        result['text'] = await generate_text(gloss_input) if gloss_input else ''
+
+    return result
@@ -2,11 +2,20 @@ import numpy as np
 import torch
 from torch import nn
 import json
-from huggingface_hub import hf_hub_download
+import os
+
+from frame_handler import RingFrameBuffer, MIN_SEQUENCE_LENGTH
+from model_store import model_store
 
 in_channels = 3
 num_nodes = 67
 
+WORD_MODEL_REPO = "Anmolkhurana88/word_level_model_states_include"
+WORD_MODEL_FILE = "saved_models/word_level_model_states_include.pth"
+
+# Memory-map the weights read-only, so every server process shares one copy in the page cache
+WORD_MODEL_MMAP = os.getenv("WORD_MODEL_MMAP", "0") == "1"
+
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 def load_json(file_path):
@@ -14,7 +23,7 @@ def load_json(file_path):
     return json.load(f)
 
 # ----- Label Decoder -----
-word_decoder = load_json("data/include_class_names.json")
+word_decoder = load_json("data/Include_class_names.json")
 
 # ----- Frame Encoder -----
 class FrameEncoder(nn.Module):
@@ -136,21 +145,36 @@ class MyModel(nn.Module):
 
 
 # ----- Load Model -----
-def load_word_model(state_dict_path):
-    # Load model state dict from local path
-    # state_dict = torch.load(state_dict_path, map_location='cpu')
-
-    # Download model state from Hugging Face Hub
-    model_path = hf_hub_download(repo_id="Anmolkhurana88/word_level_model_states_include", filename=state_dict_path)
-    state_dict = torch.load(model_path, map_location='cpu')
-
-    model = MyModel(
+def build_word_model():
+    """Word-level MyModel architecture, randomly initialised."""
+    return MyModel(
         num_nodes*in_channels,
         [], [], 0.0, 480, 1024, 3, 8, 0.0, [1024], [0.5],
         len(word_decoder), rnn_type="TRANSFORMER"
     )
 
-    model.load_state_dict(state_dict)
+def load_word_model(state_dict_path, mmap=WORD_MODEL_MMAP):
+    # Load model state dict from local path
+    # state_dict = torch.load(state_dict_path, map_location='cpu')
+
+    if mmap:
+        # Parameters become views of the mapped file (copy-on-write, inference never writes them).
+        # Built on the meta device so no randomly initialised copy is allocated first.
+        model_path = model_store.resolve_mmap(WORD_MODEL_REPO, state_dict_path)
+        state_dict = torch.load(model_path, map_location='cpu', mmap=True, weights_only=True)
+
+        with torch.device('meta'):
+            model = build_word_model()
+
+        model.load_state_dict(state_dict, assign=True)
+    else:
+        # Model state from the local model cache, downloaded from Hugging Face Hub on a miss
+        model_path = model_store.resolve(WORD_MODEL_REPO, state_dict_path)
+        state_dict = torch.load(model_path, map_location='cpu')
+
+        model = build_word_model()
+        model.load_state_dict(state_dict)
+
     model.to(device)
 
     model.eval()
@@ -158,12 +182,18 @@ def load_word_model(state_dict_path):
 
 
 # ----- Predict Word Gloss -----
+def to_model_input(frame_seq):
+    """(T, N, F) float32 input from a list of frames or a (T, N, F) tensor, no copy if already one."""
+    if not isinstance(frame_seq, torch.Tensor):
+        frame_seq = torch.stack(list(frame_seq))
+
+    return frame_seq.to(device=device, dtype=torch.float32)
+
 def predict_word_gloss(model, frame_seq):
-    if not frame_seq or len(frame_seq) == 0:
+    if frame_seq is None or len(frame_seq) == 0:
         return "", 0.0
     
-    x = torch.stack(frame_seq).unsqueeze(0).to(device)
-    x = x.to(dtype=torch.float32)
+    x = to_model_input(frame_seq).unsqueeze(0)
 
     with torch.no_grad():
         out = model(x)
@@ -173,6 +203,68 @@ def predict_word_gloss(model, frame_seq):
     return word_decoder[ypred.item()], val.item()
 
 
+# ----- Predict Word Gloss (Batched) -----
+def predict_word_gloss_batch(model, frame_seqs, embedded=False):
+    """
+    Predict glosses for several equal-length frame sequences in one forward pass.
+    With embedded=True the sequences are cached frame embeddings (see EmbeddingFrameBuffer)
+    and only the SequenceClassifier runs.
+    Returns a list of (word_gloss, confidence) in the order of frame_seqs.
+    """
+    if len(frame_seqs) == 0:
+        return []
+
+    if len(frame_seqs) == 1:
+        x = to_model_input(frame_seqs[0]).unsqueeze(0)
+    else:
+        x = torch.stack([to_model_input(seq) for seq in frame_seqs])
+
+    with torch.no_grad():
+        if embedded:
+            out = model.sequence_classifier(x)
+        else:
+            out = model(x)
+        out = nn.functional.softmax(out, dim=1)
+
+    vals, ypreds = torch.max(out, 1)
+    return [(word_decoder[y], v) for y, v in zip(ypreds.tolist(), vals.tolist())]
+
+
+# ----- Streaming Inference -----
+def encode_frames(model, frames):
+    """(T, N, F) frames -> (T, frame_dim) FrameEncoder embeddings."""
+    with torch.no_grad():
+        return model.frame_encoder(to_model_input(frames).unsqueeze(0))[0]
+
+class EmbeddingFrameBuffer(RingFrameBuffer):
+    """
+    RingFrameBuffer that also caches each frame's FrameEncoder embedding. Frames are
+    projected once on arrival, so sliding-window inference only runs the
+    SequenceClassifier over the cached window.
+    """
+    def __init__(self, model, max_size=25):
+        super().__init__(max_size)
+        self.model = model
+
+        frame_dim = encode_frames(model, torch.zeros((1, num_nodes, in_channels))).shape[-1]
+        self.embeddings = torch.zeros((2 * max_size, frame_dim), dtype=torch.float32, device=device)
+
+    def add_frame(self, frame):
+        index = self.write_index
+        super().add_frame(frame)
+
+        embedding = encode_frames(self.model, self.storage[index:index + 1])[0]
+        self.embeddings[index] = embedding
+        self.embeddings[index + self.max_size] = embedding
+
+    def get_embeddings(self):
+        """Zero-copy (T, frame_dim) view of the cached window, only valid until the next add_frame."""
+        if self.size < MIN_SEQUENCE_LENGTH:
+            return []
+
+        return self.window(self.embeddings)
+
+
 if __name__ == "__main__":
     model = load_word_model("saved_models/word_level_model_states_include.pth")
     print(model)